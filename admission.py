@@ -0,0 +1,153 @@
+import os
+import uuid
+import logging
+import threading
+from collections import deque
+from functools import wraps
+from time import time, perf_counter
+from flask import g, request
+from game_state import redis_client
+import metrics
+
+NORMAL = 'normal'
+DEGRADED = 'degraded'
+
+
+def _env(name, default):
+    return type(default)(os.environ.get(name, default))
+
+
+def request_queue_wait():
+    """
+    Seconds the request waited before a worker picked it up, from the proxy's
+    X-Request-Start header (nginx: proxy_set_header X-Request-Start "t=${msec}";).
+    0 without the header: a sync worker can't see its listen backlog otherwise.
+    """
+    header = request.headers.get('X-Request-Start', '')
+    try:
+        start = float(header[2:] if header.startswith('t=') else header)
+    except ValueError:
+        return 0.0
+    # Seconds ($msec), or milliseconds / microseconds since the epoch
+    while start > 1e11:
+        start /= 1000
+    return max(0.0, time() - start)
+
+
+class AdmissionController:
+    """
+    Admission control for one route, driven by how many of its requests are
+    in flight across all workers and by its recent p95 latency in this worker,
+    counted from when the request reached the proxy (see request_queue_wait).
+
+    Past the enter thresholds the route switches to degraded mode (views read
+    g.degraded and do less work); it only switches back once both signals are
+    under the lower exit thresholds and it has been degraded for min_dwell
+    seconds, so it doesn't flap. Requests are turned away past reject_in_flight,
+    or once they have queued for reject_queue_wait: the client is gone by then.
+    """
+
+    def __init__(self, route, enter_in_flight, exit_in_flight, enter_latency, exit_latency,
+                 reject_in_flight, reject_queue_wait, min_dwell=15, window=50, request_timeout=30):
+        self.route = route
+        self.enter_in_flight = enter_in_flight
+        self.exit_in_flight = exit_in_flight
+        self.enter_latency = enter_latency
+        self.exit_latency = exit_latency
+        self.reject_in_flight = reject_in_flight
+        self.reject_queue_wait = reject_queue_wait
+        self.min_dwell = min_dwell
+        # In-flight requests older than this are assumed lost with their worker
+        self.request_timeout = request_timeout
+        self.in_flight_key = f"admission:{route}:in_flight"
+        self.mode = NORMAL
+        self.mode_since = time()
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+        metrics.set_gauge('fs_degraded', 0, route=route)
+
+    def p95_latency(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+        return latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+
+    def _set_mode(self, mode, in_flight, p95):
+        with self.lock:
+            if mode == self.mode:
+                return
+            self.mode = mode
+            self.mode_since = time()
+        metrics.set_gauge('fs_degraded', int(mode == DEGRADED), route=self.route)
+        metrics.inc_counter('fs_mode_changes_total', route=self.route, mode=mode)
+        logging.warning(f"{self.route} switched to {mode} mode (in flight: {in_flight}, p95: {p95:.2f}s)")
+
+    def enter(self, queue_wait=0.0):
+        """Register a request that queued for queue_wait seconds; returns (mode, token), with mode None if it is rejected."""
+        if queue_wait > self.reject_queue_wait:
+            metrics.inc_counter('fs_rejected_total', route=self.route)
+            with self.lock:
+                self.latencies.append(queue_wait)
+            return None, None
+        token = uuid.uuid4().hex
+        now = time()
+        pipe = redis_client.pipeline()
+        pipe.zremrangebyscore(self.in_flight_key, '-inf', now - self.request_timeout)
+        pipe.zadd(self.in_flight_key, {token: now})
+        pipe.zcard(self.in_flight_key)
+        pipe.expire(self.in_flight_key, self.request_timeout)
+        in_flight = pipe.execute()[2]
+        metrics.set_gauge('fs_in_flight', in_flight, route=self.route)
+
+        if in_flight > self.reject_in_flight:
+            redis_client.zrem(self.in_flight_key, token)
+            metrics.inc_counter('fs_rejected_total', route=self.route)
+            return None, None
+
+        p95 = self.p95_latency()
+        if self.mode == NORMAL and (in_flight > self.enter_in_flight or p95 > self.enter_latency):
+            self._set_mode(DEGRADED, in_flight, p95)
+        elif (self.mode == DEGRADED and in_flight <= self.exit_in_flight and p95 <= self.exit_latency
+              and time() - self.mode_since >= self.min_dwell):
+            self._set_mode(NORMAL, in_flight, p95)
+        return self.mode, token
+
+    def exit(self, token, latency):
+        redis_client.zrem(self.in_flight_key, token)
+        with self.lock:
+            self.latencies.append(latency)
+        metrics.set_gauge('fs_p95_latency_seconds', round(self.p95_latency(), 3), route=self.route)
+
+    def guard(self, busy_response):
+        """Decorator: admit the request, set g.degraded, or answer busy_response() if rejected."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                queue_wait = request_queue_wait()
+                mode, token = self.enter(queue_wait)
+                if mode is None:
+                    return busy_response()
+                g.degraded = mode == DEGRADED
+                start_time = perf_counter()
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    self.exit(token, queue_wait + perf_counter() - start_time)
+            return wrapper
+        return decorator
+
+
+# /start must answer inside the frame client's ~5s timeout. A sync worker
+# serves one request at a time, so in-flight /start requests top out at the
+# worker count (FS_WORKERS, as in gunicorn.conf.py) per instance: degrade once
+# every worker is on /start, and reject on in-flight only when several
+# instances share the Redis.
+WORKERS = _env('FS_WORKERS', 4)
+start_admission = AdmissionController(
+    'start',
+    enter_in_flight=_env('START_DEGRADE_IN_FLIGHT', max(1, WORKERS - 1)),
+    exit_in_flight=_env('START_RECOVER_IN_FLIGHT', max(1, WORKERS // 2)),
+    enter_latency=_env('START_DEGRADE_P95', 3.0),
+    exit_latency=_env('START_RECOVER_P95', 1.5),
+    reject_in_flight=_env('START_REJECT_IN_FLIGHT', WORKERS * 3),
+    reject_queue_wait=_env('START_REJECT_QUEUE_WAIT', 4.0),
+)
@@ -1,15 +1,24 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, g
 from datetime import datetime
-from sloot_data import fetch_sloot_data, generate_random_addresses
-from image_generator import generate_profile_image, generate_battle_image, generate_result_image
+from sloot_data import fetch_sloot_data, fetch_enemy_sloot, get_enemy_catalog, SLOOT_API_TIMEOUT
+from image_generator import generate_profile_image, generate_battle_image, generate_result_image, load_font, load_background, load_image_data_url
 from battle import simulate_battle, estimate_win_chance
+from game_state import get_game_state, start_game, move_enemy_index, record_battle_result, append_enemy, set_enemy_result, maybe_compact_stale_sessions, memory_stats
+from response_cache import idempotent
+from admission import start_admission
+import profiler
+import jobs
+import metrics
+from equipment_catalog import decode_sloot
+import os
 import re
-import pytz
+import gc
+import hmac
+import importlib
 import json
-import numpy as np
-import redis
-import base64
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
 from logging.handlers import RotatingFileHandler
 from logging.config import dictConfig
 from time import time
@@ -33,7 +42,7 @@ dictConfig({
                 "class": "logging.handlers.RotatingFileHandler",
                 "level": "DEBUG",
                 "formatter": "default",   
-                "filename": "/home/ec2-user/logs/fs-app.log",  
+                "filename": os.path.join(os.environ.get('FS_LOG_DIR', '/home/ec2-user/logs'), "fs-app.log"),
                 "maxBytes": 20*1024*1024,   # 20M max
                 "backupCount": 10,          # 10 files max
                 "encoding": "utf8",        
@@ -50,15 +59,78 @@ dictConfig({
 
 app = Flask(__name__)
 
-# Configure Redis client
-redis_client = redis.Redis(host='localhost', port=6379, db=0)  # Update with your Redis configuration
-
 profile_bg_path = "./static/asset/profile_bg.png"
 battle_bg_path = "./static/asset/battle_bg.png"
 win_bg_path = "./static/asset/win_bg.png"
 loss_bg_path = "./static/asset/loss_bg.png"
 draw_path = "./static/asset/draw.png"
 
+# Enemies made by /start; "Next Enemy" past the last one appends a new one
+INITIAL_ENEMIES = 5
+# Enemies kept in a game state, the oldest are dropped beyond this
+MAX_STORED_ENEMIES = int(os.environ.get('MAX_STORED_ENEMIES', 10))
+NUM_SIMULATIONS = 160
+# Degraded /start under overload (see admission.py): fewer enemies up front, the
+# rest come from the open-ended enemy list, fewer simulations per win chance and
+# a pre-rendered image instead of a profile image per enemy. The game is marked
+# degraded, so the enemies it gets later are made the same cheap way.
+DEGRADED_INITIAL_ENEMIES = 2
+DEGRADED_SIMULATIONS = 40
+DEGRADED_PROFILE_IMAGE = os.environ.get('DEGRADED_PROFILE_IMAGE', "https://frame-survivor-jp.s3.ap-northeast-1.amazonaws.com/asset/cover.png")
+# How long "Next Enemy" waits for an in-flight prefetch before giving up on it,
+# well inside the frame client's ~5s timeout
+PREFETCH_TIMEOUT = float(os.environ.get('PREFETCH_TIMEOUT', 2.0))
+
+# Ethereum address, as accepted by /get_sloot
+ADDRESS_PATTERN = re.compile(r'^0x[a-fA-F0-9]{40}$')
+# /get_sloot/batch limits. Lookups run on one shared executor per worker. The
+# stream ends at BATCH_DEADLINE, inside gunicorn's 30s worker timeout, and
+# lookups that haven't finished by then are reported as timed out.
+BATCH_CONCURRENCY = int(os.environ.get('SLOOT_BATCH_CONCURRENCY', 16))
+MAX_BATCH_ADDRESSES = 500
+BATCH_DEADLINE = 2 * SLOOT_API_TIMEOUT + 2
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY)
+
+# Background threads that prepare the next enemy while the player looks at the current one.
+# Threads only start on the first submit, so this is safe to create before gunicorn forks.
+prefetch_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('PREFETCH_WORKERS', 4)))
+_prefetches = {}  # (fid, starting_hash, enemy number) -> Future
+_prefetches_lock = threading.Lock()
+
+
+def warmup():
+    """
+    Pay the first-request costs once, in the gunicorn master before it forks
+    (see gunicorn.conf.py), so every worker shares the result copy-on-write:
+    lazy imports, fonts, decoded backgrounds and the battle code path.
+    """
+    # Lazily imported by the request handlers
+    for module_name in ('pytz', 'web3', 'bs4'):
+        importlib.import_module(module_name)
+    importlib.import_module('pytz').timezone("Asia/Singapore")
+
+    for font_path, size in [('DePixelHalbfett.ttf', 28), ('DePixelHalbfett.ttf', 20), ('DePixelKlein.ttf', 25),
+                            ('PressStart2P.ttf', 55), ('PressStart2P.ttf', 38), ('LevelUp.otf', 65)]:
+        load_font(font_path, size)
+    for background_path in [profile_bg_path, battle_bg_path, win_bg_path, loss_bg_path]:
+        load_background(background_path)
+    load_image_data_url(draw_path)
+    # Map the enemy catalog once in the master; the workers inherit the mapping
+    get_enemy_catalog()
+
+    # Run the keccak + battle code once on a dummy sloot
+    from sloot_data import calculate_greatness
+    from battle import initialize_character
+    dummy_sloot = {'equipment': [['', 1, calculate_greatness('0x' + '00' * 20, 'WEAPON')]] * 8}
+    dummy_sloot['character'] = initialize_character(dummy_sloot)
+    estimate_win_chance(dummy_sloot, dummy_sloot, num_simulations=1)
+
+    # Move everything allocated so far out of the GC's reach, so collections
+    # in the workers don't touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+    logging.info("Warmup done")
+
 """ 
 # Example of Farcaster Signature Packet json
 {
@@ -80,7 +152,7 @@ draw_path = "./static/asset/draw.png"
   }
 }
 
-# Structure of game_state
+# Structure of game_state (as get_game_state() returns it; Redis stores it as a hash, see game_state.py)
 {
     fid:{ 
     'starting_hash': '',
@@ -88,7 +160,9 @@ draw_path = "./static/asset/draw.png"
     'enemies_sloot': [],
     'profile_pic_urls': [],
     'current_enemy_index': 0,
-    'win_chance': 0,
+    'enemy_offset': 0,   # enemies dropped from the front of enemies_sloot
+    'win_chance': [],
+    'degraded': False,   # made in degraded mode, see admission.py
     'explore_times': 0,
     'battles': 0,
     'wins':0,
@@ -100,26 +174,111 @@ draw_path = "./static/asset/draw.png"
 
 class CustomEncoder(json.JSONEncoder):
     def default(self, obj):
+        import numpy as np  # only reached for non-JSON types, keep numpy off the import path
         if isinstance(obj, np.int64):
             return int(obj)
         # Let the base class default method raise the TypeError
         return json.JSONEncoder.default(self, obj)
 
-def get_game_state(fid):
-    """Fetch and deserialize the game state from Redis."""
-    game_state_key = f"game_state:{fid}"
-    game_state_json = redis_client.get(game_state_key)
-    if game_state_json:
-        return json.loads(game_state_json)
+def num_simulations_for(game_state):
+    return DEGRADED_SIMULATIONS if game_state.get('degraded') else NUM_SIMULATIONS
+
+def generate_enemy(player_sloot, starting_hash, enemy_number, degraded=False):
+    """Fetch, render and estimate enemy #enemy_number of the game started with starting_hash."""
+    enemy_sloot = fetch_enemy_sloot(starting_hash, enemy_number)
+    if degraded:
+        return enemy_sloot, DEGRADED_PROFILE_IMAGE, estimate_win_chance(player_sloot, enemy_sloot, DEGRADED_SIMULATIONS)
+    profile_pic_url = generate_profile_image(player_sloot, enemy_sloot, profile_bg_path)
+    win_chance = estimate_win_chance(player_sloot, enemy_sloot, NUM_SIMULATIONS)
+    return enemy_sloot, profile_pic_url, win_chance
+
+def next_enemy_number(game_state):
+    return game_state.get('enemy_offset', 0) + len(game_state['enemies_sloot'])
+
+def _store_next_enemy(fid, game_state, enemy_number):
+    start_time = time() #-----
+    profiler.set_route('/explore:prefetch')
+    try:
+        enemy_sloot, profile_pic_url, win_chance = generate_enemy(game_state['player_sloot'], game_state['starting_hash'], enemy_number,
+                                                               game_state.get('degraded', False))
+        append_enemy(fid, game_state['starting_hash'], enemy_number, enemy_sloot, profile_pic_url, win_chance,
+                     MAX_STORED_ENEMIES, cls=CustomEncoder)
+    except Exception as e:
+        logging.warning(f"Prefetching enemy {enemy_number} for {fid} failed: {e}")
+        raise
+    finally:
+        profiler.clear_route()
+    logging.info(f"Prefetched enemy {enemy_number} for {fid} in {time() - start_time:.2f} seconds") #-----
+
+def prefetch_next_enemy(fid, game_state):
+    """Start preparing the enemy after the last stored one, unless it is already in flight."""
+    key = (fid, game_state['starting_hash'], next_enemy_number(game_state))
+    with _prefetches_lock:
+        future = _prefetches.get(key)
+        if future is not None:
+            return future
+        future = prefetch_executor.submit(_store_next_enemy, fid, game_state, key[2])
+        _prefetches[key] = future
+    # Outside the lock: the callback runs right away if the job already finished
+    future.add_done_callback(lambda _: _forget_prefetch(key))
+    return future
+
+def _forget_prefetch(key):
+    with _prefetches_lock:
+        _prefetches.pop(key, None)
+
+def enqueue_enemy_jobs(fid, game_state):
+    """Queue a job for every win chance and profile image the game state is still missing."""
+    queued = []
+    for position, enemy_win_chance in enumerate(game_state['win_chance']):
+        enemy_number = game_state.get('enemy_offset', 0) + position
+        if enemy_win_chance is None:
+            queued.append(jobs.make_job(jobs.WIN_CHANCE, fid, game_state['starting_hash'], enemy_number,
+                                        num_simulations=num_simulations_for(game_state)))
+        if game_state['profile_pic_urls'][position] is None:
+            queued.append(jobs.make_job(jobs.PROFILE_IMAGE, fid, game_state['starting_hash'], enemy_number,
+                                        background=profile_bg_path))
+    jobs.enqueue_jobs(queued)
+
+def current_enemy_result(fid, game_state, field):
+    """
+    The current enemy's win chance or profile image. If its job hasn't
+    finished yet, compute it here and store it so it's only done once.
+    """
+    position = game_state['current_enemy_index']
+    value = game_state[field][position]
+    if value is not None:
+        return value
+    enemy_sloot = game_state['enemies_sloot'][position]
+    if field == 'win_chance':
+        value = estimate_win_chance(game_state['player_sloot'], enemy_sloot, num_simulations_for(game_state))
+    elif game_state.get('degraded'):
+        value = DEGRADED_PROFILE_IMAGE
     else:
-        return None  # Handle non-existing game state appropriately
+        value = generate_profile_image(game_state['player_sloot'], enemy_sloot, profile_bg_path)
+    metrics.inc_counter('fs_jobs_computed_inline_total', field=field)
+    set_enemy_result(fid, game_state['starting_hash'], game_state.get('enemy_offset', 0) + position, field, value)
+    game_state[field][position] = value
+    return value
 
-def save_game_state(fid, game_state):
-    """Serialize and save the game state to Redis."""
-    game_state_key = f"game_state:{fid}"
-    redis_client.set(game_state_key, json.dumps(game_state))
+def busy_response():
+    """Sent instead of a game when /start is overloaded; the player can simply retry."""
+    response_html = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta property="fc:frame" content="vNext" />
+        <meta property="fc:frame:post_url" content="http://vanishk.xyz/games/frame-survivor/start" />
+        <meta property="fc:frame:image" content="https://frame-survivor-jp.s3.ap-northeast-1.amazonaws.com/asset/cover.png" />
+        <meta property="fc:frame:button:1" content="Too Many Survivors, Try Again" />
+    </head>
+    </html>"""
+    # no-store keeps it out of the response cache, so a retry gets a real game
+    return Response(response_html, status=200, mimetype='text/html', headers={'Cache-Control': 'no-store'})
 
 @app.route('/start', methods=['POST'])
+@idempotent
+@start_admission.guard(busy_response)
 def start():
     start_time = time() #-----
     
@@ -134,27 +293,34 @@ def start():
     # logging.info(f"player sloot: {player_sloot}") #-----
     
     fetch_start_time = time() #-----
-    enemies_sloot = [fetch_sloot_data(address) for address in generate_random_addresses(5)]
+    # Enemies are derived from the starting hash, so a game's enemy set is reproducible
+    initial_enemies = DEGRADED_INITIAL_ENEMIES if g.degraded else INITIAL_ENEMIES
+    enemies_sloot = [fetch_enemy_sloot(starting_hash, index) for index in range(initial_enemies)]
     fetch_time = time() - fetch_start_time #-----
     # logging.info(f"Game state updated: {enemies_sloot}") #-----
     logging.info(f"Time taken to fetch enemy data: {fetch_time:.2f} seconds") #-----
     
     image_gen_start_time = time() #-----
-    # Generate profile images and store URLs
-    profile_pic_urls = [generate_profile_image(player_sloot, enemy, profile_bg_path) for enemy in enemies_sloot]
+    num_simulations = DEGRADED_SIMULATIONS if g.degraded else NUM_SIMULATIONS
+    if g.degraded:
+        # Pre-rendered, so an overloaded /start renders nothing
+        profile_pic_urls = [DEGRADED_PROFILE_IMAGE] * len(enemies_sloot)
+    elif jobs.ASYNC_JOBS:
+        # Only the first enemy is needed for the response, the job workers do the rest
+        profile_pic_urls = [generate_profile_image(player_sloot, enemies_sloot[0], profile_bg_path)] + [None] * (len(enemies_sloot) - 1)
+    else:
+        # Generate profile images and store URLs
+        profile_pic_urls = [generate_profile_image(player_sloot, enemy, profile_bg_path) for enemy in enemies_sloot]
+    if jobs.ASYNC_JOBS:
+        win_chance = [None] * len(enemies_sloot)
+    else:
+        # Estimate win chances before the state is stored, so it is written once
+        win_chance = [estimate_win_chance(player_sloot, enemy, num_simulations) for enemy in enemies_sloot]
     image_gen_time = time() - image_gen_start_time #-----
     logging.info(f"Time taken to generate profile images: {image_gen_time:.2f} seconds") #-----
+    logging.info(f"win chance {win_chance}") #-----
     
-    game_state_key = f"game_state:{fid}"
-    
-   # Fetch existing explore_times and increment
-    existing_state = redis_client.get(game_state_key)
-    if existing_state:
-        existing_state = json.loads(existing_state)
-        explore_times = existing_state.get('explore_times', 0) + 1
-    else:
-        explore_times = 1
-    
+    import pytz
     current_time = datetime.now(pytz.timezone("Asia/Singapore")).strftime("%Y/%m/%d %H:%M:%S")
 
     # Prepare the game state to store in Redis
@@ -164,24 +330,17 @@ def start():
         'enemies_sloot': enemies_sloot,
         'profile_pic_urls': profile_pic_urls,
         'current_enemy_index': 0,
-        'explore_times': explore_times,
-        'battles': 0,
-        'wins': 0,
-        'draws': 0,
+        'enemy_offset': 0,
+        'win_chance': win_chance,
+        'degraded': g.degraded,
         'last_enter_time': current_time,
     }
     
-    # Store the game state in Redis
-    redis_client.set(game_state_key, json.dumps(game_state, cls=CustomEncoder))
+    # Store the new session in one atomic call; it bumps explore_times and keeps battles/wins/draws
+    start_game(fid, game_state, cls=CustomEncoder)
     
-    
-    # Use global game state to calculate win chances
-    game_state = get_game_state(fid)
-    win_chance = [estimate_win_chance(game_state['player_sloot'], enemy) for enemy in game_state['enemies_sloot']]
-    logging.info(f"win chance {win_chance}") #-----
-    
-    game_state['win_chance'] = win_chance
-    save_game_state(fid, game_state)
+    if jobs.ASYNC_JOBS:
+        enqueue_enemy_jobs(fid, game_state)
     
     
     total_time = time() - start_time #-----
@@ -207,6 +366,7 @@ def start():
 
 
 @app.route('/explore', methods=['POST'])
+@idempotent
 def explore():
 
     start_time = time() #-----
@@ -214,10 +374,23 @@ def explore():
     fid = signature_packet.get('untrustedData')['fid']    
     button_index = signature_packet.get('untrustedData')['buttonIndex']
     
-    game_state = get_game_state(fid)
-    
     logging.info(f"fetching button: {button_index}")
     
+    # Move the enemy index and read the state back in one atomic call
+    if button_index == 1:  # Previous Enemy
+        game_state, moved = move_enemy_index(fid, -1)
+    elif button_index == 3:  # Next Enemy
+        game_state, moved = move_enemy_index(fid, 1)
+        if game_state and not moved:
+            # Past the last enemy: wait for its prefetch (or start it), then move onto it
+            try:
+                prefetch_next_enemy(fid, game_state).result(timeout=PREFETCH_TIMEOUT)
+            except Exception as e:
+                logging.warning(f"Next enemy for {fid} is not ready: {e}")
+            game_state, moved = move_enemy_index(fid, 1)
+    else:
+        game_state, moved = move_enemy_index(fid, 0)
+    
     if not game_state:
         return Response("Game is not started or state is missing.", 400)
  
@@ -233,32 +406,11 @@ def explore():
     logging.info(f"Corresponding enemy sloot: {game_state['player_sloot']}") #-----
     logging.info(f"Corresponding enemy sloot: {enemies_sloot[current_enemy_index]}") #-----
     logging.info(f"Corresponding win chance: {win_chance[current_enemy_index]}") #-----
-    
-    # Compute current enemy index posi
-    if button_index == 1 and current_enemy_index > 0:  # Previous Enemy
-        current_enemy_index -= 1
-    elif button_index == 3 and current_enemy_index < len(enemies_sloot) - 1:  # Next Enemy
-        current_enemy_index += 1
-        
-    game_state['current_enemy_index'] = current_enemy_index
-    save_game_state(fid, game_state)
     logging.info(f"enemy index updated")  #-----
 
-    # Generating enemy logic:
-    # elif button_index == 3:  # Next Enemy
-    #     if current_enemy_index < len(enemies_sloot) - 1:
-    #         current_enemy_index += 1
-    #     elif len(enemies_sloot) < 10:  # Generate new enemy if less than 10 enemies            
-    #         new_enemy_sloot = fetch_sloot_data(generate_random_addresses(1)[0])
-    #         enemies_sloot.append(new_enemy_sloot)
-    #         new_profile_pic_url = generate_profile_image(player_sloot, new_enemy_sloot, profile_bg_path)
-            
-    #         game_state[fid]['profile_pic_urls'].append(new_profile_pic_url)
-    #         current_enemy_index += 1
-    
     if button_index == 2:  # Battle
         enemy_sloot = enemies_sloot[current_enemy_index]
-        win_chance = win_chance[current_enemy_index]
+        win_chance = current_enemy_result(fid, game_state, 'win_chance')
         battle_image = generate_battle_image(player_sloot, enemy_sloot, win_chance, battle_bg_path)
         enter_battle_response = f"""
         <!DOCTYPE html>
@@ -281,10 +433,9 @@ def explore():
         return Response(enter_battle_response, status=200, mimetype='text/html')
     
     
-    # Determine Button presence
-    buttons_html = ""
-    if current_enemy_index < len(enemies_sloot)-1:
-        buttons_html = '<meta property="fc:frame:button:3" content="▶︎ Next Enemy" />'
+    # Prepare enemy N+1 while the player looks at enemy N, so "Next Enemy" is instant
+    if current_enemy_index == len(enemies_sloot) - 1:
+        prefetch_next_enemy(fid, game_state)
         
     # Create final response
     response_html = f"""
@@ -293,10 +444,10 @@ def explore():
     <head>
         <meta property="fc:frame" content="vNext" />
         <meta property="fc:frame:post_url" content="http://vanishk.xyz/games/frame-survivor/explore" />
-        <meta property="fc:frame:image" content="{game_state['profile_pic_urls'][current_enemy_index]}" />
+        <meta property="fc:frame:image" content="{current_enemy_result(fid, game_state, 'profile_pic_urls')}" />
         <meta property="fc:frame:button:1" content="◀︎ Previous Enemy" />
         <meta property="fc:frame:button:2" content="◉ Battle" />
-        {buttons_html}
+        <meta property="fc:frame:button:3" content="▶︎ Next Enemy" />
     </head>
     </html>
     """
@@ -308,6 +459,7 @@ def explore():
 
 
 @app.route('/battle', methods=['POST'])
+@idempotent
 def battle():
     
     start_time = time() #-----
@@ -316,13 +468,15 @@ def battle():
     button_index = signature_packet.get('untrustedData')['buttonIndex']
     game_state = get_game_state(fid)
     
-    if not game_state:
+    if not game_state or 'enemies_sloot' not in game_state:
             return Response("Game is not started or state is missing.", 400)
  
     current_enemy_index = game_state['current_enemy_index']
     player_sloot = game_state['player_sloot']
     enemy_sloot = game_state['enemies_sloot'][current_enemy_index]
     win_chance = game_state['win_chance'][current_enemy_index]
+    if win_chance is None:  # Its job hasn't finished yet
+        win_chance = estimate_win_chance(player_sloot, enemy_sloot, num_simulations_for(game_state))
     
     fetching_time = time() - start_time #-----
     logging.info(f"Fetching time: {fetching_time:.2f} seconds") #-----
@@ -333,15 +487,19 @@ def battle():
         # Simulate the battle, get final result
         simulate_start_time = time() #-----
         battle_result = simulate_battle(player_sloot, enemy_sloot)
-        game_state['battles'] += 1
         
         simulate_time = time() - simulate_start_time #-----
         logging.info(f"Time taken to simulate battle: {simulate_time:.2f} seconds") #-----
         logging.info(f"battle: {battle_result}") #-----
 
 
+        # Count the result and clear the session in one atomic call; a
+        # double-tapped Fight finds the session already cleared
+        if not record_battle_result(fid, game_state['starting_hash'], battle_result):
+            return Response("Game is not started or state is missing.", 400)
+        logging.info(f"data clear") #-----
+
         if battle_result == 'win':
-            game_state['wins'] += 1
             button_text = "Doubt You Can Survive Again!"
             result_image = generate_result_image('win',win_chance,win_bg_path)
         elif battle_result == 'lose':
@@ -349,22 +507,7 @@ def battle():
             result_image = generate_result_image('lose',win_chance,loss_bg_path)
         else:
             button_text = "That..is..Unbelivable"
-            with open(draw_path, 'rb') as image_file:
-                image_data = image_file.read()
-                base64_encoded_data = base64.b64encode(image_data)
-                base64_message = base64_encoded_data.decode('utf-8')
-                result_image = f"data:image/png;base64,{base64_message}"
-            game_state['draws'] += 1
-
-        # Clear other data in the game_state
-        game_state.pop('player_sloot', None)
-        game_state.pop('enemies_sloot', None)
-        game_state.pop('profile_pic_urls', None)
-        game_state.pop('current_enemy_index', None)
-        game_state.pop('starting_hash', None)
-        game_state.pop('character', None)
-        
-        logging.info(f"data clear") #-----
+            result_image = load_image_data_url(draw_path)
 
         # Generate response HTML
         response_html = f"""
@@ -389,16 +532,124 @@ def battle():
     
     return
 
+@app.before_request
+def tag_profiler_route():
+    # The route pattern, not the raw path, so scanners and ids can't grow the tag set
+    profiler.set_route(request.url_rule.rule if request.url_rule else '<unmatched>')
+
+@app.teardown_request
+def untag_profiler_route(exc):
+    profiler.clear_route()
+
+@app.after_request
+def schedule_compaction(response):
+    # Runs once the response has been sent, so no player waits on the sweep
+    response.call_on_close(_compact_stale_sessions)
+    return response
+
+def _compact_stale_sessions():
+    try:
+        compacted = maybe_compact_stale_sessions()
+        if compacted:
+            metrics.inc_counter('fs_sessions_compacted_total', compacted)
+            logging.info(f"Compacted {compacted} stale sessions")
+    except Exception as e:
+        logging.warning(f"Session compaction failed: {e}")
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    for name, value in memory_stats().items():
+        metrics.set_gauge(f"fs_redis_{name}", value)
+    for name, value in jobs.queue_stats().items():
+        metrics.set_gauge(f"fs_jobs_{name}", value)
+    return Response(metrics.render(), status=200, mimetype='text/plain')
+
+def is_admin_request():
+    # The admin endpoints don't exist unless ADMIN_TOKEN is set
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    return bool(admin_token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token)
+
+@app.route('/admin/profile', methods=['POST'])
+def start_profile():
+    """Profile this worker for ?seconds=N; mode=cpu (collapsed stacks) or mode=alloc (tracemalloc top-N)."""
+    if not is_admin_request():
+        return Response("Not found", 404)
+    mode = request.args.get('mode', 'cpu')
+    if mode not in ('cpu', 'alloc'):
+        return jsonify({'error': 'mode must be cpu or alloc'}), 400
+    profile_id = profiler.start_profile(mode, request.args.get('seconds', 10, type=int),
+                                        top=request.args.get('top', 25, type=int), route_filter=request.args.get('route'))
+    if not profile_id:
+        return jsonify({'error': 'A profile is already running in this worker'}), 409
+    return jsonify({'id': profile_id, 'pid': os.getpid(), 'result': f"/admin/profile/{profile_id}"}), 202
+
+@app.route('/admin/profile/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    if not is_admin_request():
+        return Response("Not found", 404)
+    result = profiler.get_profile_result(profile_id)
+    if result is None:
+        return jsonify({'status': 'running'}), 202
+    return Response(result, status=200, mimetype='text/plain')
+
 @app.route('/get_sloot', methods=['GET'])
 def get_sloot():
     address = request.args.get('address')
 
     # Validation for Ethereum addresses
-    if not address or not re.match(r'^0x[a-fA-F0-9]{40}$', address):
+    if not address or not ADDRESS_PATTERN.match(address):
         return jsonify({'error': 'Invalid address provided'}), 400
 
     try:
         sloot_data = fetch_sloot_data(address)
-        return jsonify(sloot_data)
+        return jsonify(decode_sloot(sloot_data))
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/get_sloot/batch', methods=['POST'])
+def get_sloot_batch():
+    """
+    Look up many addresses at once: POST {"addresses": [...]}. The response is
+    newline-delimited JSON streamed as each lookup finishes, in completion
+    order: one sloot per line, or {"address": ..., "error": ...} for an
+    address that is invalid or failed.
+    """
+    body = request.get_json(silent=True)
+    addresses = body.get('addresses') if isinstance(body, dict) else body
+    if not isinstance(addresses, list) or not addresses:
+        return jsonify({'error': 'Expected {"addresses": [...]}'}), 400
+    if len(addresses) > MAX_BATCH_ADDRESSES:
+        return jsonify({'error': f'At most {MAX_BATCH_ADDRESSES} addresses per batch'}), 400
+
+    def is_valid(address):
+        return isinstance(address, str) and ADDRESS_PATTERN.match(address)
+
+    # Each address is looked up once, however often it is listed
+    valid = list(dict.fromkeys(address for address in addresses if is_valid(address)))
+    invalid = [address for address in addresses if not is_valid(address)]
+
+    def generate():
+        for address in invalid:
+            yield json.dumps({'address': address, 'error': 'Invalid address provided'}) + '\n'
+        if not valid:
+            return
+        futures = {batch_executor.submit(fetch_sloot_data, address): address for address in valid}
+        pending = set(futures)
+        try:
+            for future in as_completed(futures, timeout=BATCH_DEADLINE):
+                pending.discard(future)
+                try:
+                    line = json.dumps(decode_sloot(future.result()), cls=CustomEncoder)
+                except Exception as e:
+                    line = json.dumps({'address': futures[future], 'error': str(e)})
+                yield line + '\n'
+        except TimeoutError:
+            for future in pending:
+                yield json.dumps({'address': futures[future], 'error': 'Timed out'}) + '\n'
+        finally:
+            # Drop lookups that haven't started, e.g. if the client went away
+            for future in pending:
+                future.cancel()
+
+    logging.info(f"Streaming {len(valid)} sloots, {len(invalid)} invalid addresses")
+    return Response(generate(), status=200, mimetype='application/x-ndjson')
@@ -1,9 +1,8 @@
 import random
-import numpy as np
 import logging
 
-def roll_3d6():
-    return (random.randint(1,6),random.randint(1,6),random.randint(1,6))
+def roll_3d6(rng=random):
+    return (rng.randint(1,6),rng.randint(1,6),rng.randint(1,6))
 
 def check_difficulty_level(dice_value, qualifiy_value):
     '''
@@ -29,7 +28,10 @@ def check_difficulty_level(dice_value, qualifiy_value):
         return 0
 
 
-def initialize_character(sloot):
+def initialize_character(sloot, rng=None):
+    # A seeded rng makes the character reproducible, the module rng otherwise
+    rng = rng or random
+    
     # Initializing Equipment
     equipment = sloot['equipment']
     
@@ -48,14 +50,14 @@ def initialize_character(sloot):
         if item[2] >18:
             great_items +=1
             
-    STR = weapon_e + np.sum(roll_3d6())*3 #(8,99)
-    CON = int(np.average([chest_e,head_e,waist_e]) + np.sum(roll_3d6())*3) #(8,99)
-    DEX = foot_e + np.sum(roll_3d6())*3 #(8,99)
-    INT = head_e + np.sum(roll_3d6())*3 #(8,99)
-    APP = great_items * 10 + np.sum(roll_3d6()) #(3,98)
-    LUK = neck_g + np.sum(roll_3d6()) + great_items #(3,46)
-    SIZ = chest_e + np.sum(roll_3d6())*3 #(8,99)
-    HP = int((CON + SIZ) * sum(roll_3d6())/10) #(28, 356)
+    STR = weapon_e + sum(roll_3d6(rng))*3 #(8,99)
+    CON = int((chest_e + head_e + waist_e) / 3 + sum(roll_3d6(rng))*3) #(8,99)
+    DEX = foot_e + sum(roll_3d6(rng))*3 #(8,99)
+    INT = head_e + sum(roll_3d6(rng))*3 #(8,99)
+    APP = great_items * 10 + sum(roll_3d6(rng)) #(3,98)
+    LUK = neck_g + sum(roll_3d6(rng)) + great_items #(3,46)
+    SIZ = chest_e + sum(roll_3d6(rng))*3 #(8,99)
+    HP = int((CON + SIZ) * sum(roll_3d6(rng))/10) #(28, 356)
 
     # POW
     # EDU
@@ -0,0 +1,163 @@
+"""
+Precomputed enemy catalog: a flat file of fixed-width enemy records that the
+workers mmap, so picking an enemy is a random offset into shared pages instead
+of an upstream loot API call.
+
+    python enemy_catalog.py build enemies.bin --count 1000000 --workers 32
+    python enemy_catalog.py build enemies.bin --from-ndjson sloots.ndjson
+    python enemy_catalog.py info enemies.bin
+
+File layout (little-endian):
+    header   HEADER_FORMAT: magic, version, record size, record count, string table offset
+    records  RECORD_FORMAT: address (20 bytes), 8 item ids (uint32), 8 levels (uint8),
+             8 greatness (uint8), rating (uint16)
+    strings  uint32 count, then per item name: uint16 length + UTF-8 bytes; item ids index this table
+"""
+import os
+import sys
+import json
+import mmap
+import random
+import struct
+import logging
+from battle import initialize_character
+from equipment_catalog import encode_item, item_name, decode_sloot
+
+MAGIC = b'FSENEMY1'
+VERSION = 1
+HEADER_FORMAT = '<8sIIQQ'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_FORMAT = '<20s8I8B8BH'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+N_ITEMS = 8
+
+
+class EnemyCatalog:
+    def __init__(self, path):
+        with open(path, 'rb') as catalog_file:
+            # The mapping stays valid after the file is closed; pages are shared
+            # through the page cache by every worker that maps the same file
+            self._mmap = mmap.mmap(catalog_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, self.record_count, strings_offset = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+            raise ValueError(f"{path} is not a version {VERSION} enemy catalog")
+        if self.record_count == 0:
+            raise ValueError(f"{path} has no enemies")
+        self.item_names = self._read_strings(strings_offset)
+        # The file stores names so it survives catalog table changes; intern them once here
+        self.item_codes = [encode_item(name) for name in self.item_names]
+
+    def _read_strings(self, offset):
+        (count,) = struct.unpack_from('<I', self._mmap, offset)
+        offset += 4
+        names = []
+        for _ in range(count):
+            (length,) = struct.unpack_from('<H', self._mmap, offset)
+            names.append(self._mmap[offset + 2:offset + 2 + length].decode('utf-8'))
+            offset += 2 + length
+        return names
+
+    def __len__(self):
+        return self.record_count
+
+    def record(self, index):
+        """The sloot stored at index, without a character."""
+        fields = struct.unpack_from(RECORD_FORMAT, self._mmap, HEADER_SIZE + index * RECORD_SIZE)
+        address, item_ids = fields[0], fields[1:1 + N_ITEMS]
+        levels, greatness = fields[1 + N_ITEMS:1 + 2 * N_ITEMS], fields[1 + 2 * N_ITEMS:1 + 3 * N_ITEMS]
+        equipment = [[self.item_codes[item_ids[i]], levels[i], greatness[i]] for i in range(N_ITEMS)]
+        return {'address': '0x' + address.hex(), 'equipment': equipment, 'Rating': fields[-1]}
+
+    def sample(self, rng=None):
+        """A random enemy sloot with a freshly rolled character."""
+        rng = rng or random
+        sloot = self.record(rng.randrange(self.record_count))
+        sloot['character'] = initialize_character(sloot, rng)
+        return sloot
+
+
+def write_catalog(path, sloots):
+    """Write an iterable of sloots to a catalog file; returns the number of records."""
+    item_ids = {}
+    record_count = 0
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as catalog_file:
+        catalog_file.write(b'\0' * HEADER_SIZE)
+        for sloot in sloots:
+            equipment = sloot['equipment']
+            if len(equipment) != N_ITEMS:
+                continue
+            ids = [item_ids.setdefault(item_name(item[0]), len(item_ids)) for item in equipment]
+            catalog_file.write(struct.pack(RECORD_FORMAT, bytes.fromhex(sloot['address'][2:]), *ids,
+                                           *[item[1] for item in equipment], *[item[2] for item in equipment],
+                                           sloot['Rating']))
+            record_count += 1
+
+        strings_offset = catalog_file.tell()
+        catalog_file.write(struct.pack('<I', len(item_ids)))
+        for name in item_ids:  # dicts keep insertion order, which is id order
+            encoded = name.encode('utf-8')
+            catalog_file.write(struct.pack('<H', len(encoded)) + encoded)
+
+        catalog_file.seek(0)
+        catalog_file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, RECORD_SIZE, record_count, strings_offset))
+    # Workers may have the old file mapped; replacing it leaves their mapping intact
+    os.replace(tmp_path, path)
+    return record_count
+
+
+def fetch_random_sloots(count, workers):
+    """Fetch sloots for count random addresses from the loot API, in parallel."""
+    from concurrent.futures import ThreadPoolExecutor
+    from sloot_data import fetch_sloot_data, generate_random_addresses
+
+    def fetch(address):
+        try:
+            return fetch_sloot_data(address)
+        except Exception as e:
+            logging.warning(f"Skipping {address}: {e}")
+            return None
+
+    with ThreadPoolExecutor(workers) as executor:
+        # In chunks, so millions of pending futures are never held at once
+        for chunk_start in range(0, count, 10000):
+            addresses = generate_random_addresses(min(10000, count - chunk_start))
+            for sloot in executor.map(fetch, addresses):
+                if sloot:
+                    yield sloot
+
+
+def read_ndjson_sloots(path):
+    """Sloots from a file with one sloot JSON object per line."""
+    with open(path, 'r', encoding='utf-8') as ndjson_file:
+        for line in ndjson_file:
+            line = line.strip()
+            if line:
+                sloot = json.loads(line)
+                if 'equipment' in sloot:
+                    yield sloot
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="build a catalog file")
+    build.add_argument('path')
+    build.add_argument('--count', type=int, default=100000, help="random addresses to fetch")
+    build.add_argument('--workers', type=int, default=16, help="parallel loot API calls")
+    build.add_argument('--from-ndjson', help="read sloots from this file instead of the loot API")
+    info = subparsers.add_parser('info', help="describe a catalog file")
+    info.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        sloots = read_ndjson_sloots(args.from_ndjson) if args.from_ndjson else fetch_random_sloots(args.count, args.workers)
+        record_count = write_catalog(args.path, sloots)
+        print(f"wrote {record_count} enemies to {args.path} ({os.path.getsize(args.path) / 1024 / 1024:.1f} MB)")
+    else:
+        catalog = EnemyCatalog(args.path)
+        print(f"{len(catalog)} enemies, {len(catalog.item_names)} distinct items, {RECORD_SIZE} bytes per record")
+        json.dump(decode_sloot(catalog.record(0)), sys.stdout, indent=4)
+        print()
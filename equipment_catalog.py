@@ -0,0 +1,134 @@
+import re
+from functools import lru_cache
+
+# Integer-coded equipment. A loot item name is made of a base item plus an
+# optional "prefix suffix" name pair, an optional "of ..." suffix and an
+# optional "+1", e.g. '"Grim Shout" Grave Wand of Skill +1'. Each part is
+# interned into a small id from the fixed tables below (the Loot contract's
+# word lists) and the ids are packed into one int:
+#
+#   bits 0-6 base | 7-13 name prefix | 14-18 name suffix | 19-23 suffix | 24 "+1"
+#
+# with id 0 meaning "none". Codes are stable across processes and releases as
+# long as the tables are only ever appended to. Sloot equipment entries are
+# [code, level, greatness]; a name the tables can't express stays a string,
+# and every function here accepts either form.
+
+# Equipment Level Mapping
+level_mapping = {
+    # Weapons
+    "Warhammer": 5, "Quarterstaff": 4, "Maul": 3, "Mace": 2, "Club": 1,
+    "Katana": 5, "Falchion": 4, "Scimitar": 3, "Long Sword": 2, "Short Sword": 1,
+    "Ghost Wand": 5, "Grave Wand": 4, "Bone Wand": 3, "Wand": 2,
+    "Grimoire": 5, "Chronicle": 4, "Tome": 3, "Book": 2,
+    # Chest
+    "Divine Robe": 5, "Silk Robe": 4, "Linen Robe": 3, "Robe": 2, "Shirt": 1,
+    "Demon Husk": 5, "Dragonskin Armor": 4, "Studded Leather Armor": 3, "Hard Leather Armor": 2, "Leather Armor": 1,
+    "Holy Chestplate": 5, "Ornate Chestplate": 4, "Plate Mail": 3, "Chain Mail": 2, "Ring Mail": 1,
+    # Head
+    "Ancient Helm": 5, "Ornate Helm": 4, "Great Helm": 3, "Full Helm": 2, "Helm": 1,
+    "Demon Crown": 5, "Dragon's Crown": 4, "War Cap": 3, "Leather Cap": 2, "Cap": 1,
+    "Crown": 5, "Divine Hood": 4, "Silk Hood": 3, "Linen Hood": 2, "Hood": 1,
+    # Waist
+    "Ornate Belt": 5, "War Belt": 4, "Plated Belt": 3, "Mesh Belt": 2, "Heavy Belt": 1,
+    "Demonhide Belt": 5, "Dragonskin Belt": 4, "Studded Leather Belt": 3, "Hard Leather Belt": 2, "Leather Belt": 1,
+    "Brightsilk Sash": 5, "Silk Sash": 4, "Wool Sash": 3, "Linen Sash": 2, "Sash": 1,
+    # Foot
+    "Holy Greaves": 5, "Ornate Greaves": 4, "Greaves": 3, "Chain Boots": 2, "Heavy Boots": 1,
+    "Demonhide Boots": 5, "Dragonskin Boots": 4, "Studded Leather Boots": 3, "Hard Leather Boots": 2, "Leather Boots": 1,
+    "Divine Slippers": 5, "Silk Slippers": 4, "Wool Shoes": 3, "Linen Shoes": 2, "Shoes": 1,
+    # Hand
+    "Holy Gauntlets": 5, "Ornate Gauntlets": 4, "Gauntlets": 3, "Chain Gloves": 2, "Heavy Gloves": 1,
+    "Demon's Hands": 5, "Dragonskin Gloves": 4, "Studded Leather Gloves": 3, "Hard Leather Gloves": 2, "Leather Gloves": 1,
+    "Divine Gloves": 5, "Silk Gloves": 4, "Wool Gloves": 3, "Linen Gloves": 2, "Gloves": 1,
+    # Neck
+    "Necklace": 3, "Amulet": 3, "Pendant": 3,
+    # Ring
+    "Gold Ring": 3, "Platinum Ring": 3, "Titanium Ring": 3, "Silver Ring": 2, "Bronze Ring": 1,
+}
+
+# Index 0 of every table is "none"
+BASE_ITEMS = [None] + list(level_mapping)
+NAME_PREFIXES = [None,
+    "Agony", "Apocalypse", "Armageddon", "Beast", "Behemoth", "Blight", "Blood", "Bramble", "Brimstone", "Brood",
+    "Carrion", "Cataclysm", "Chimeric", "Corpse", "Corruption", "Damnation", "Death", "Demon", "Dire", "Dragon",
+    "Dread", "Doom", "Dusk", "Eagle", "Empyrean", "Fate", "Foe", "Gale", "Ghoul", "Gloom", "Glyph", "Golem", "Grim",
+    "Hate", "Havoc", "Honour", "Horror", "Hypnotic", "Kraken", "Loath", "Maelstrom", "Mind", "Miracle", "Morbid",
+    "Oblivion", "Onslaught", "Pain", "Pandemonium", "Phoenix", "Plague", "Rage", "Rapture", "Rune", "Skull", "Sol",
+    "Soul", "Sorrow", "Spirit", "Storm", "Tempest", "Torment", "Vengeance", "Victory", "Viper", "Vortex", "Woe",
+    "Wrath", "Light's", "Shimmering",
+]
+NAME_SUFFIXES = [None,
+    "Bane", "Root", "Bite", "Song", "Roar", "Grasp", "Instrument", "Glow", "Bender", "Shadow", "Whisper", "Shout",
+    "Growl", "Tear", "Peak", "Form", "Sun", "Moon",
+]
+SUFFIXES = [None,
+    "of Power", "of Giants", "of Titans", "of Skill", "of Perfection", "of Brilliance", "of Enlightenment",
+    "of Protection", "of Anger", "of Rage", "of Fury", "of Vitriol", "of the Fox", "of Detection", "of Reflection",
+    "of the Twins",
+]
+
+# Level of every base item, by base id; the same level get_level() finds in a full name
+BASE_LEVELS = [1] + list(level_mapping.values())
+
+_BASE_IDS = {name: i for i, name in enumerate(BASE_ITEMS) if name}
+_NAME_PREFIX_IDS = {name: i for i, name in enumerate(NAME_PREFIXES) if name}
+_NAME_SUFFIX_IDS = {name: i for i, name in enumerate(NAME_SUFFIXES) if name}
+_SUFFIX_IDS = {name: i for i, name in enumerate(SUFFIXES) if name}
+
+_ITEM_PATTERN = re.compile(r'^(?:"(?P<name_prefix>\S+) (?P<name_suffix>\S+)" )?(?P<base>.+?)'
+                           r'(?: (?P<suffix>of .+?))?(?P<plus> \+1)?$')
+
+
+def get_level(item_name):
+    for key in level_mapping:
+        if key in item_name:
+            return level_mapping[key]
+    return 1  # Default level if not found
+
+
+@lru_cache(maxsize=4096)
+def encode_item(item_name):
+    """The item code for a loot item name, or the name itself if the tables can't express it."""
+    match = _ITEM_PATTERN.match(item_name)
+    if not match:
+        return item_name
+    base_id = _BASE_IDS.get(match['base'], 0)
+    name_prefix_id = _NAME_PREFIX_IDS.get(match['name_prefix'], 0) if match['name_prefix'] else 0
+    name_suffix_id = _NAME_SUFFIX_IDS.get(match['name_suffix'], 0) if match['name_suffix'] else 0
+    suffix_id = _SUFFIX_IDS.get(match['suffix'], 0) if match['suffix'] else 0
+    code = base_id | name_prefix_id << 7 | name_suffix_id << 14 | suffix_id << 19 | bool(match['plus']) << 24
+    # Only keep the code if it decodes back to exactly the same name
+    if not base_id or item_name_from_code(code) != item_name:
+        return item_name
+    return code
+
+
+@lru_cache(maxsize=4096)
+def item_name_from_code(code):
+    base = BASE_ITEMS[code & 0x7F]
+    name_prefix, name_suffix = NAME_PREFIXES[code >> 7 & 0x7F], NAME_SUFFIXES[code >> 14 & 0x1F]
+    suffix, plus = SUFFIXES[code >> 19 & 0x1F], code >> 24 & 1
+    name = base
+    if name_prefix and name_suffix:
+        name = f'"{name_prefix} {name_suffix}" {name}'
+    if suffix:
+        name = f"{name} {suffix}"
+    if plus:
+        name = f"{name} +1"
+    return name
+
+
+def item_name(item):
+    """Display name of an item code (or of an item still stored as a name)."""
+    return item if isinstance(item, str) else item_name_from_code(item)
+
+
+def item_level(item):
+    """Level of an item code (or of an item still stored as a name)."""
+    return get_level(item) if isinstance(item, str) else BASE_LEVELS[item & 0x7F]
+
+
+def decode_sloot(sloot):
+    """A copy of the sloot with item names instead of codes, for JSON clients."""
+    return {**sloot, 'equipment': [[item_name(item), level, greatness] for item, level, greatness in sloot['equipment']]}
@@ -0,0 +1,488 @@
+import os
+import json
+import redis
+from time import time
+
+# One pool per worker process; redis-py resets it after gunicorn forks
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+redis_pool = redis.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=int(os.environ.get('REDIS_MAX_CONNECTIONS', 50)),
+    timeout=5,
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+# Lifecycle: a game_state key lives STATS_TTL after the player's last action,
+# which bounds how long explore_times/wins/battles/draws are kept. The heavy
+# session fields only live SESSION_TTL: compact_stale_sessions() strips them
+# from sessions that have been idle longer than that.
+SESSION_TTL = int(os.environ.get('GAME_SESSION_TTL', 60 * 60))
+STATS_TTL = int(os.environ.get('GAME_STATS_TTL', 30 * 24 * 60 * 60))
+COMPACTION_INTERVAL = int(os.environ.get('GAME_COMPACTION_INTERVAL', 5 * 60))
+# Seconds one in-request sweep may take; a bigger backlog is left to the next request
+COMPACTION_TIME_BUDGET = float(os.environ.get('GAME_COMPACTION_TIME_BUDGET', 0.5))
+
+# Sorted set of fids with a session in progress, scored by last activity
+ACTIVE_SESSIONS_KEY = "game_state:active"
+COMPACTION_LOCK_KEY = "game_state:compaction_lock"
+
+# A game state is a hash with one JSON value per field, so each transition
+# only touches the few small fields it needs instead of decoding and
+# re-encoding the sloots and base64 images of the whole game inside Redis.
+# Per-enemy values live in "<list field>:<enemy number>" fields, e.g.
+# "profile_pic_urls:7"; get_game_state() puts them back into lists.
+
+# Fields kept across games, owned by the transitions below
+STATS_FIELDS = ['explore_times', 'battles', 'wins', 'draws']
+# Every other field only lives for one exploration and is dropped once the
+# battle is fought
+KEPT_FIELDS = STATS_FIELDS + ['last_enter_time']
+# Per-enemy lists of the game state dict
+ENEMY_FIELDS = ['enemies_sloot', 'profile_pic_urls', 'win_chance']
+
+# Shared by the scripts below. migrate_state() turns a state written as one
+# JSON string, before states were hashes, into a hash of its kept fields (a
+# session in progress is dropped). clear_session() drops every field but the
+# kept ones.
+STATE_HELPERS_LUA = """
+local KEPT_FIELDS = {%s}
+
+local function migrate_state(key)
+    if redis.call('TYPE', key)['ok'] ~= 'string' then
+        return
+    end
+    local old = cjson.decode(redis.call('GET', key))
+    local ttl = redis.call('PTTL', key)
+    redis.call('DEL', key)
+    for _, field in ipairs(KEPT_FIELDS) do
+        if old[field] ~= nil then
+            redis.call('HSET', key, field, cjson.encode(old[field]))
+        end
+    end
+    if ttl > 0 and redis.call('EXISTS', key) == 1 then
+        redis.call('PEXPIRE', key, ttl)
+    end
+end
+
+local function clear_session(key)
+    local kept = {}
+    for _, field in ipairs(KEPT_FIELDS) do
+        kept[field] = true
+    end
+    local fields = {}
+    for _, field in ipairs(redis.call('HKEYS', key)) do
+        if not kept[field] then
+            table.insert(fields, field)
+        end
+    end
+    if #fields > 0 then
+        redis.call('HDEL', key, unpack(fields))
+    end
+end
+""" % ', '.join(f"'{field}'" for field in KEPT_FIELDS)
+
+# The transitions below run as Lua scripts, so each one is a single atomic
+# round trip: a double-tap can't interleave between the read and the write.
+# All of them take KEYS[1]: game state key, KEYS[2]: ACTIVE_SESSIONS_KEY and
+# ARGV[1]: fid, ARGV[2]: now, ARGV[3]: STATS_TTL, then their own arguments.
+# A starting_hash argument is JSON, like the stored value it is compared to.
+
+# ARGV[4..]: field, value pairs of the new session (without the stats fields)
+# Replaces the session, keeps the stats and bumps explore_times; returns the
+# new explore_times.
+START_GAME_LUA = STATE_HELPERS_LUA + """
+migrate_state(KEYS[1])
+clear_session(KEYS[1])
+local explore_times = redis.call('HINCRBY', KEYS[1], 'explore_times', 1)
+redis.call('HSET', KEYS[1], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+return explore_times
+"""
+
+# ARGV[4]: index delta (-1, 0 or 1)
+# Returns {1 if the index moved else 0, the state's HGETALL}, or nil if no
+# exploration is in progress.
+MOVE_ENEMY_INDEX_LUA = STATE_HELPERS_LUA + """
+migrate_state(KEYS[1])
+local state = redis.call('HMGET', KEYS[1], 'current_enemy_index', 'enemy_count')
+local index, count = tonumber(state[1]), tonumber(state[2])
+if not index or not count then
+    return nil
+end
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+local new_index = math.max(0, math.min(index + tonumber(ARGV[4]), count - 1))
+if new_index ~= index then
+    redis.call('HSET', KEYS[1], 'current_enemy_index', new_index)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {new_index ~= index and 1 or 0, redis.call('HGETALL', KEYS[1])}
+"""
+
+# ARGV[4]: 'win' | 'lose' | 'draw', ARGV[5]: starting_hash of the game the
+# battle was fought in
+# Returns the state's HGETALL, or nil if that game was already finished.
+RECORD_BATTLE_RESULT_LUA = STATE_HELPERS_LUA + """
+migrate_state(KEYS[1])
+if redis.call('HGET', KEYS[1], 'starting_hash') ~= ARGV[5] then
+    return nil
+end
+redis.call('HINCRBY', KEYS[1], 'battles', 1)
+if ARGV[4] == 'win' then
+    redis.call('HINCRBY', KEYS[1], 'wins', 1)
+elseif ARGV[4] == 'draw' then
+    redis.call('HINCRBY', KEYS[1], 'draws', 1)
+end
+clear_session(KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('ZREM', KEYS[2], ARGV[1])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# ARGV[4]: starting_hash of the game, ARGV[5]: enemy number (enemy_offset +
+# position in the list), ARGV[6], ARGV[7], ARGV[8]: enemy sloot, profile image
+# and win chance JSON, ARGV[9]: max stored enemies. Appending is idempotent:
+# an enemy number that is already stored is not appended again. The oldest
+# enemies are dropped past the cap.
+# Returns 1 if appended, 0 if already stored, or nil if that game is no longer
+# in progress.
+APPEND_ENEMY_LUA = STATE_HELPERS_LUA + """
+migrate_state(KEYS[1])
+local state = redis.call('HMGET', KEYS[1], 'starting_hash', 'enemy_offset', 'enemy_count', 'current_enemy_index')
+if state[1] ~= ARGV[4] or not state[3] then
+    return nil
+end
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+local offset, count, index = tonumber(state[2]) or 0, tonumber(state[3]), tonumber(state[4])
+local number = tonumber(ARGV[5])
+if offset + count ~= number then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'enemies_sloot:' .. number, ARGV[6], 'profile_pic_urls:' .. number, ARGV[7],
+           'win_chance:' .. number, ARGV[8])
+count = count + 1
+while count > tonumber(ARGV[9]) do
+    redis.call('HDEL', KEYS[1], 'enemies_sloot:' .. offset, 'profile_pic_urls:' .. offset, 'win_chance:' .. offset)
+    offset = offset + 1
+    count = count - 1
+    index = math.max(0, index - 1)
+end
+redis.call('HSET', KEYS[1], 'enemy_offset', offset, 'enemy_count', count, 'current_enemy_index', index)
+return 1
+"""
+
+# KEYS[1]: game state key, ARGV[1]: starting_hash of the game, ARGV[2]: enemy
+# number, ARGV[3]: per-enemy list field ('win_chance' or 'profile_pic_urls'),
+# ARGV[4]: value JSON. Fills in a result computed off the request path; the
+# key's TTL and the player's activity are left alone.
+# Returns 1 if stored, 0 if the game or that enemy is gone.
+SET_ENEMY_RESULT_LUA = STATE_HELPERS_LUA + """
+migrate_state(KEYS[1])
+if redis.call('HGET', KEYS[1], 'starting_hash') ~= ARGV[1] then
+    return 0
+end
+local field = ARGV[3] .. ':' .. ARGV[2]
+if redis.call('HEXISTS', KEYS[1], field) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], field, ARGV[4])
+return 1
+"""
+
+# KEYS[1]: game state key, KEYS[2]: ACTIVE_SESSIONS_KEY, ARGV[1]: fid,
+# ARGV[2]: idle cutoff
+# Clears the session if the fid is still idle past the cutoff (it may have
+# moved since the sweep listed it); returns 1 if the state was compacted.
+COMPACT_SESSION_LUA = STATE_HELPERS_LUA + """
+local last_active = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if last_active and tonumber(last_active) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+migrate_state(KEYS[1])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+clear_session(KEYS[1])
+return 1
+"""
+
+_start_game = redis_client.register_script(START_GAME_LUA)
+_move_enemy_index = redis_client.register_script(MOVE_ENEMY_INDEX_LUA)
+_record_battle_result = redis_client.register_script(RECORD_BATTLE_RESULT_LUA)
+_append_enemy = redis_client.register_script(APPEND_ENEMY_LUA)
+_set_enemy_result = redis_client.register_script(SET_ENEMY_RESULT_LUA)
+_compact_session = redis_client.register_script(COMPACT_SESSION_LUA)
+
+# Per-process throttle for maybe_compact_stale_sessions()
+_last_compaction_attempt = 0
+
+
+def game_state_key(fid):
+    return f"game_state:{fid}"
+
+
+def _transition_args(fid):
+    return [fid, int(time()), STATS_TTL]
+
+
+def _encode_state(game_state, cls=None):
+    """Hash fields for a game state dict, with its per-enemy lists split into one field per enemy."""
+    enemy_offset = game_state.get('enemy_offset', 0)
+    fields = {}
+    for key, value in game_state.items():
+        if key in ENEMY_FIELDS:
+            for position, enemy_value in enumerate(value):
+                fields[f"{key}:{enemy_offset + position}"] = json.dumps(enemy_value, cls=cls)
+        else:
+            fields[key] = json.dumps(value, cls=cls)
+    if 'enemies_sloot' in game_state:
+        fields['enemy_count'] = json.dumps(len(game_state['enemies_sloot']))
+    return fields
+
+
+def _decode_state(fields):
+    """The game state dict for hash fields, given as a dict or as a script's flat HGETALL reply."""
+    if isinstance(fields, list):
+        fields = dict(zip(fields[::2], fields[1::2]))
+    if not fields:
+        return None
+    game_state, enemy_values = {}, {}
+    for field, value in fields.items():
+        key, _, enemy_number = field.decode('utf-8').partition(':')
+        if enemy_number:
+            enemy_values[key, int(enemy_number)] = json.loads(value)
+        else:
+            game_state[key] = json.loads(value)
+    enemy_count = game_state.pop('enemy_count', None)
+    if enemy_count is not None:
+        enemy_offset = game_state.get('enemy_offset', 0)
+        for key in ENEMY_FIELDS:
+            game_state[key] = [enemy_values.get((key, number))
+                               for number in range(enemy_offset, enemy_offset + enemy_count)]
+    return game_state
+
+
+def get_game_state(fid):
+    """Fetch and deserialize the game state from Redis."""
+    try:
+        fields = redis_client.hgetall(game_state_key(fid))
+    except redis.ResponseError:
+        # Still a JSON string from before states were hashes
+        return json.loads(redis_client.get(game_state_key(fid)))
+    return _decode_state(fields)  # None for a non-existing game state
+
+
+def start_game(fid, game_state, cls=None):
+    """Replace the session with a new one, keeping the stats, and bump explore_times; returns explore_times."""
+    game_state = {key: value for key, value in game_state.items() if key not in STATS_FIELDS}
+    fields = [item for field_value in _encode_state(game_state, cls).items() for item in field_value]
+    return _start_game(keys=[game_state_key(fid), ACTIVE_SESSIONS_KEY], args=_transition_args(fid) + fields)
+
+
+def move_enemy_index(fid, delta):
+    """Move current_enemy_index by delta, clamped to the enemy list; returns (state, moved)."""
+    result = _move_enemy_index(keys=[game_state_key(fid), ACTIVE_SESSIONS_KEY],
+                               args=_transition_args(fid) + [delta])
+    if not result:
+        return None, False
+    moved, fields = result
+    return _decode_state(fields), bool(moved)
+
+
+def record_battle_result(fid, starting_hash, battle_result):
+    """Count the battle and clear the session, once per game; returns the state."""
+    fields = _record_battle_result(keys=[game_state_key(fid), ACTIVE_SESSIONS_KEY],
+                                   args=_transition_args(fid) + [battle_result, json.dumps(starting_hash)])
+    return _decode_state(fields) if fields is not None else None
+
+
+def append_enemy(fid, starting_hash, enemy_number, enemy_sloot, profile_pic_url, win_chance,
+                 max_stored_enemies, cls=None):
+    """Append enemy #enemy_number to the game unless it is already there; returns whether it was appended."""
+    return bool(_append_enemy(keys=[game_state_key(fid), ACTIVE_SESSIONS_KEY],
+                              args=_transition_args(fid) + [json.dumps(starting_hash), enemy_number,
+                                                            json.dumps(enemy_sloot, cls=cls), json.dumps(profile_pic_url),
+                                                            json.dumps(win_chance), max_stored_enemies]))
+
+
+def get_enemy_sloots(fid, starting_hash, enemy_number):
+    """(player sloot, enemy #enemy_number's sloot) of a game in progress, or None; reads just those fields."""
+    stored_hash, player_sloot, enemy_sloot = redis_client.hmget(game_state_key(fid), 'starting_hash', 'player_sloot',
+                                                                f"enemies_sloot:{enemy_number}")
+    if stored_hash is None or json.loads(stored_hash) != starting_hash or enemy_sloot is None:
+        return None
+    return json.loads(player_sloot), json.loads(enemy_sloot)
+
+
+def set_enemy_result(fid, starting_hash, enemy_number, field, value):
+    """Store a win chance or profile image computed for enemy #enemy_number; returns whether it was stored."""
+    return bool(_set_enemy_result(keys=[game_state_key(fid)],
+                                  args=[json.dumps(starting_hash), enemy_number, field, json.dumps(value)]))
+
+
+def compact_stale_sessions(batch_size=100, time_budget=None):
+    """
+    Strip the session fields from sessions idle for longer than SESSION_TTL.
+    With a time_budget (seconds) it stops after the batch that runs past it.
+    Returns (sessions compacted, whether no stale session is left).
+    """
+    cutoff = int(time()) - SESSION_TTL
+    deadline = time() + time_budget if time_budget is not None else None
+    compacted = 0
+    while True:
+        stale_fids = redis_client.zrangebyscore(ACTIVE_SESSIONS_KEY, '-inf', cutoff, start=0, num=batch_size)
+        if not stale_fids:
+            return compacted, True
+        pipe = redis_client.pipeline(transaction=False)
+        for fid in stale_fids:
+            fid = fid.decode('utf-8')
+            _compact_session(keys=[game_state_key(fid), ACTIVE_SESSIONS_KEY],
+                             args=[fid, cutoff], client=pipe)
+        compacted += sum(pipe.execute())
+        if deadline is not None and time() > deadline:
+            return compacted, False
+
+
+def maybe_compact_stale_sessions():
+    """
+    Run one time-boxed compact_stale_sessions() pass if no worker has done so
+    in the last COMPACTION_INTERVAL. A pass that runs out of time hands the
+    rest of the backlog to the next request instead of waiting an interval.
+    """
+    global _last_compaction_attempt
+    if time() - _last_compaction_attempt < COMPACTION_INTERVAL:
+        return 0
+    _last_compaction_attempt = time()
+    if not redis_client.set(COMPACTION_LOCK_KEY, 1, nx=True, ex=COMPACTION_INTERVAL):
+        return 0
+    compacted, finished = compact_stale_sessions(time_budget=COMPACTION_TIME_BUDGET)
+    if not finished:
+        redis_client.delete(COMPACTION_LOCK_KEY)
+        _last_compaction_attempt = 0
+    return compacted
+
+
+def backfill_ttls():
+    """One-off: give game_state keys written before the lifecycle policy a TTL."""
+    updated = 0
+    for key in redis_client.scan_iter(match="game_state:*", count=1000):
+        key = key.decode('utf-8')
+        if key in (ACTIVE_SESSIONS_KEY, COMPACTION_LOCK_KEY) or redis_client.ttl(key) != -1:
+            continue
+        redis_client.expire(key, STATS_TTL)
+        # Score 0 makes the next sweep strip any session fields left behind
+        redis_client.zadd(ACTIVE_SESSIONS_KEY, {key.split(':', 1)[1]: 0})
+        updated += 1
+    return updated
+
+
+def memory_stats(sample_size=20):
+    """Redis memory per active player, sampling MEMORY USAGE over active sessions."""
+    active_players = redis_client.zcard(ACTIVE_SESSIONS_KEY)
+    used_memory = redis_client.info('memory')['used_memory']
+    sampled_fids = redis_client.zrevrange(ACTIVE_SESSIONS_KEY, 0, sample_size - 1)
+    session_bytes = [redis_client.memory_usage(game_state_key(fid.decode('utf-8'))) or 0 for fid in sampled_fids]
+    return {
+        'active_players': active_players,
+        'used_memory_bytes': used_memory,
+        'used_memory_per_active_player_bytes': used_memory / active_players if active_players else 0,
+        'avg_session_bytes': sum(session_bytes) / len(session_bytes) if session_bytes else 0,
+    }
+
+
+def is_local_redis():
+    """Whether REDIS_URL points at this machine (a unix socket or a loopback host)."""
+    from urllib.parse import urlparse
+
+    url = urlparse(REDIS_URL)
+    return url.scheme == 'unix' or url.hostname in ('localhost', '127.0.0.1', '::1')
+
+
+def concurrency_check(threads=16, calls=50):
+    """Hammer one fid from many threads against a local Redis and check no update is lost."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not is_local_redis():
+        raise SystemExit(f"refusing to run the concurrency check against {REDIS_URL}: it writes test data")
+
+    fid = 'concurrency-check'
+    dummy_enemy = {'address': '0x' + '00' * 20, 'equipment': [['Wand', 2, 0]] * 8, 'Rating': 0}
+
+    def new_game(n_enemies, starting_hash='0x00'):
+        return {
+            'starting_hash': starting_hash,
+            'player_sloot': dummy_enemy,
+            'enemies_sloot': [dummy_enemy] * n_enemies,
+            'profile_pic_urls': [''] * n_enemies,
+            'win_chance': [50] * n_enemies,
+            'current_enemy_index': 0,
+        }
+
+    def hammer(fn):
+        with ThreadPoolExecutor(threads) as executor:
+            return list(executor.map(lambda _: [fn() for _ in range(calls)], range(threads)))
+
+    # A state still stored as one JSON string is migrated, keeping its stats
+    redis_client.set(game_state_key(fid), json.dumps({**new_game(1), 'explore_times': 3, 'battles': 2, 'wins': 1}))
+    start_game(fid, new_game(1))
+    state = get_game_state(fid)
+    assert (state['explore_times'], state['battles'], state['wins']) == (4, 2, 1), f"legacy stats lost: {state}"
+
+    redis_client.delete(game_state_key(fid))
+
+    # Every start must count, even when they race each other
+    hammer(lambda: start_game(fid, new_game(1)))
+    explore_times = get_game_state(fid)['explore_times']
+    assert explore_times == threads * calls, f"lost explore_times updates: {explore_times}"
+
+    # Every "next" must move the index exactly one step
+    start_game(fid, new_game(threads * calls + 1))
+    moves = hammer(lambda: move_enemy_index(fid, 1)[1])
+    assert all(moved for thread_moves in moves for moved in thread_moves)
+    index = get_game_state(fid)['current_enemy_index']
+    assert index == threads * calls, f"lost current_enemy_index updates: {index}"
+
+    # Racing appends of the same enemy must store it once, and stay under the cap
+    start_game(fid, new_game(5))
+    hammer(lambda: append_enemy(fid, '0x00', 5, dummy_enemy, '', 50, 5))
+    state = get_game_state(fid)
+    assert len(state['enemies_sloot']) == 5 and state['enemy_offset'] == 1, "enemy appended more than once"
+
+    # A double-tapped battle must only be recorded once
+    results = hammer(lambda: record_battle_result(fid, '0x00', 'win'))
+    recorded = sum(1 for thread_results in results for state in thread_results if state)
+    state = get_game_state(fid)
+    assert recorded == 1 and state['battles'] == 1 and state['wins'] == 1, f"battle recorded {recorded} times"
+    assert set(state) <= set(KEPT_FIELDS), f"session left behind: {state}"
+
+    # The stats outlive the game they were counted in
+    start_game(fid, new_game(1, starting_hash='0x01'))
+    record_battle_result(fid, '0x01', 'draw')
+    state = get_game_state(fid)
+    assert (state['battles'], state['wins'], state['draws']) == (2, 1, 1), f"stats lost across games: {state}"
+
+    redis_client.delete(game_state_key(fid))
+    redis_client.zrem(ACTIVE_SESSIONS_KEY, fid)
+    print(f"OK: {threads} threads x {calls} calls, no lost or duplicated updates")
+
+
+if __name__ == '__main__':
+    # python game_state.py check [threads] [calls per thread]   (local Redis only)
+    # python game_state.py compact | backfill | memory
+    import sys
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python game_state.py check [threads] [calls] | compact | backfill | memory")
+    command = sys.argv[1]
+    if command == 'check':
+        concurrency_check(*[int(arg) for arg in sys.argv[2:4]])
+    elif command == 'compact':
+        print(f"compacted {compact_stale_sessions()[0]} stale sessions")
+    elif command == 'backfill':
+        print(f"gave {backfill_ttls()} game states a TTL")
+    elif command == 'memory':
+        print(json.dumps(memory_stats(), indent=4))
+    else:
+        sys.exit(f"unknown command: {command}")
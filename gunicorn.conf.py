@@ -0,0 +1,17 @@
+# gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = os.environ.get('FS_BIND', '127.0.0.1:8000')
+# admission.py sizes /start's in-flight thresholds from FS_WORKERS too. Have the
+# proxy set X-Request-Start so time queued in the listen backlog counts as latency.
+workers = int(os.environ.get('FS_WORKERS', 4))
+timeout = 30
+
+# Import app.py once in the master, then fork the workers from it
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    from app import warmup
+    warmup()
@@ -1,7 +1,31 @@
 from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
 import base64
 from io import BytesIO
 import logging
+from equipment_catalog import item_name
+
+
+@lru_cache(maxsize=None)
+def load_font(font_path, size):
+    """Load a font once per process; app.warmup() fills this before fork."""
+    return ImageFont.truetype(font_path, size)
+
+
+@lru_cache(maxsize=None)
+def load_background(background_image_path):
+    """Decode a background once per process; callers draw on a copy."""
+    img = Image.open(background_image_path)
+    img.load()
+    return img
+
+
+@lru_cache(maxsize=None)
+def load_image_data_url(image_path):
+    """Read a static image as a base64 data URL once per process."""
+    with open(image_path, 'rb') as image_file:
+        base64_message = base64.b64encode(image_file.read()).decode('utf-8')
+    return f"data:image/png;base64,{base64_message}"
 
 
 def generate_profile_image(player_data, enemy_data, background_image_path):
@@ -9,7 +33,7 @@ def generate_profile_image(player_data, enemy_data, background_image_path):
     data structure: {
     'address':'0x...',
     'equipment':[
-    ['item', level(int), greatness(int)],
+    [item code(int) or name(str), level(int), greatness(int)],
     ...],
     'Rating': (int)
     'character':{
@@ -26,20 +50,20 @@ def generate_profile_image(player_data, enemy_data, background_image_path):
         }
     }
     """
-    img = Image.open(background_image_path)
+    img = load_background(background_image_path).copy()
     logging.info(f"Darwing started")
     draw = ImageDraw.Draw(img)
-    title_font = ImageFont.truetype('DePixelHalbfett.ttf', 28)
-    text_font = ImageFont.truetype("DePixelKlein.ttf", 25)
+    title_font = load_font('DePixelHalbfett.ttf', 28)
+    text_font = load_font('DePixelKlein.ttf', 25)
 
     # Draw player's, top-left
     x_player, y_player = 38, 55  
     draw.text((356, 470), f"Rating: {player_data['Rating']}", font=title_font, fill=(0, 0, 0))
-    draw.text((583, 476), f"/750 max", font=ImageFont.truetype('DePixelHalbfett.ttf', 20), fill=(0, 0, 0))
+    draw.text((583, 476), f"/750 max", font=load_font('DePixelHalbfett.ttf', 20), fill=(0, 0, 0))
     
     for equip in player_data['equipment']:
         draw.text((x_player, y_player), f"Lv.{equip[1]} | ", font=text_font, fill=(0, 0, 0))
-        draw.text((x_player + 80, y_player), equip[0], font=text_font, fill=(0, 0, 0))
+        draw.text((x_player + 80, y_player), item_name(equip[0]), font=text_font, fill=(0, 0, 0))
         draw.text((x_player + 625, y_player), f"{{{equip[2]}}}", font=text_font, fill=(0, 0, 0))
         
         y_player += 50
@@ -47,11 +71,11 @@ def generate_profile_image(player_data, enemy_data, background_image_path):
     # Draw enemy's data, bottom-right
     x_enemy, y_enemy = 1410, 385 
     draw.text((786, 327), f"Rating: {enemy_data['Rating']}", font=title_font, fill=(0, 0, 0))
-    draw.text((1013, 333), f"/750 max", font=ImageFont.truetype('DePixelHalbfett.ttf', 20), fill=(0, 0, 0))
+    draw.text((1013, 333), f"/750 max", font=load_font('DePixelHalbfett.ttf', 20), fill=(0, 0, 0))
     
     for equip in enemy_data['equipment']:
         draw.text((786, y_enemy), f"Lv.{equip[1]} | ", font=text_font, fill=(0, 0, 0))
-        draw.text((786 + 80, y_enemy), equip[0], font=text_font, fill=(0, 0, 0))
+        draw.text((786 + 80, y_enemy), item_name(equip[0]), font=text_font, fill=(0, 0, 0))
         draw.text((x_enemy, y_enemy), f"{{{equip[2]}}}", font=text_font, fill=(0, 0, 0))
         
         y_enemy += 50
@@ -74,10 +98,10 @@ def generate_profile_image(player_data, enemy_data, background_image_path):
 
 def generate_battle_image(player_data, enemy_data, win_chance, background_image_path):
     
-    img = Image.open(background_image_path)
+    img = load_background(background_image_path).copy()
     draw = ImageDraw.Draw(img)
-    att_font = ImageFont.truetype('PressStart2P.ttf', 55)
-    hp_font = ImageFont.truetype('PressStart2P.ttf', 38)
+    att_font = load_font('PressStart2P.ttf', 55)
+    hp_font = load_font('PressStart2P.ttf', 38)
 
     # Draw player's, top-left
     attack_p = player_data['character']['ATK']
@@ -116,9 +140,9 @@ def generate_battle_image(player_data, enemy_data, win_chance, background_image_
 
 def generate_result_image(battle_result, win_chance, background_image_path):
     
-    img = Image.open(background_image_path)
+    img = load_background(background_image_path).copy()
     draw = ImageDraw.Draw(img)
-    font = ImageFont.truetype('LevelUp.otf', 65)
+    font = load_font('LevelUp.otf', 65)
     
     wcx = len(str(win_chance))-1 #win_chance word length multiple
     
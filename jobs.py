@@ -0,0 +1,162 @@
+"""
+Job queue that takes win chance estimates and profile image renders off the
+/start response path. /start stores the game with placeholders (None) and
+enqueues a job per missing result; workers fill the results into the game
+state, and /explore and /battle compute anything still missing inline.
+
+    ASYNC_JOBS=1 gunicorn -c gunicorn.conf.py app:app
+    python jobs.py --concurrency 4
+
+Off unless ASYNC_JOBS=1, since something has to run the workers next to
+gunicorn. Jobs live in a Redis list. A job id names one result of one game,
+and an id is only enqueued once per JOB_DEDUPE_TTL, so retries and duplicate
+/start calls don't queue the same work twice. The list is capped at
+MAX_QUEUE_LENGTH (the oldest jobs are dropped) and workers skip jobs older
+than JOB_MAX_AGE: by then the player has had the result computed inline.
+The jobs are CPU-bound pure Python, so --concurrency starts worker processes,
+not threads. All job keys share the {jobs} hash tag, so the enqueue script
+also runs on Redis Cluster.
+"""
+import os
+import json
+import logging
+import multiprocessing
+from time import time
+from game_state import redis_client, get_enemy_sloots, set_enemy_result
+
+QUEUE_KEY = "{jobs}:queue"
+STATS_KEY = "{jobs}:stats"
+JOB_DEDUPE_TTL = 10 * 60
+JOB_MAX_AGE = int(os.environ.get('JOB_MAX_AGE', 120))
+MAX_QUEUE_LENGTH = int(os.environ.get('JOB_MAX_QUEUE_LENGTH', 10000))
+WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', 4))
+ASYNC_JOBS = os.environ.get('ASYNC_JOBS', '0') == '1'
+
+WIN_CHANCE = 'win_chance'
+PROFILE_IMAGE = 'profile_image'
+
+# KEYS[1]: QUEUE_KEY, KEYS[2]: STATS_KEY, KEYS[3..]: dedupe key of each job,
+# ARGV[1]: dedupe TTL, ARGV[2]: max queue length, ARGV[3]: max job age,
+# ARGV[4..]: job JSONs, in the same order as their dedupe keys
+# Enqueues every job whose id hasn't been seen within the TTL, then trims the
+# oldest jobs past the max length; returns how many were enqueued. With no
+# worker running the queue expires once nothing was enqueued for the max age.
+ENQUEUE_LUA = """
+local enqueued = 0
+for i = 4, #ARGV do
+    if redis.call('SET', KEYS[i - 1], 1, 'NX', 'EX', ARGV[1]) then
+        redis.call('LPUSH', KEYS[1], ARGV[i])
+        enqueued = enqueued + 1
+    end
+end
+local trimmed = redis.call('LLEN', KEYS[1]) - tonumber(ARGV[2])
+if trimmed > 0 then
+    redis.call('LTRIM', KEYS[1], 0, tonumber(ARGV[2]) - 1)
+    redis.call('HINCRBY', KEYS[2], 'trimmed', trimmed)
+end
+if enqueued > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+redis.call('HINCRBY', KEYS[2], 'enqueued', enqueued)
+redis.call('HINCRBY', KEYS[2], 'deduplicated', #ARGV - 3 - enqueued)
+return enqueued
+"""
+
+_enqueue = redis_client.register_script(ENQUEUE_LUA)
+
+
+def dedupe_key(job_id):
+    return f"{{jobs}}:dedupe:{job_id}"
+
+
+def make_job(job_type, fid, starting_hash, enemy_number, **params):
+    return {'id': f"{job_type}:{fid}:{starting_hash}:{enemy_number}", 'type': job_type, 'fid': fid,
+            'starting_hash': starting_hash, 'enemy_number': enemy_number, 'enqueued_at': time(), **params}
+
+
+def enqueue_jobs(jobs):
+    """Queue jobs, skipping ids already queued recently; returns how many were queued."""
+    if not jobs:
+        return 0
+    return _enqueue(keys=[QUEUE_KEY, STATS_KEY] + [dedupe_key(job['id']) for job in jobs],
+                    args=[JOB_DEDUPE_TTL, MAX_QUEUE_LENGTH, JOB_MAX_AGE] + [json.dumps(job) for job in jobs])
+
+
+def queue_stats():
+    stats = {key.decode('utf-8'): int(value) for key, value in redis_client.hgetall(STATS_KEY).items()}
+    stats['depth'] = redis_client.llen(QUEUE_KEY)
+    return stats
+
+
+def run_job(job):
+    """Compute one result and store it in the game state; returns whether it was stored."""
+    from battle import estimate_win_chance
+    from image_generator import generate_profile_image
+
+    sloots = get_enemy_sloots(job['fid'], job['starting_hash'], job['enemy_number'])
+    if not sloots:
+        return False  # The game ended, a new one started or the enemy was dropped from the list
+    player_sloot, enemy_sloot = sloots
+
+    if job['type'] == WIN_CHANCE:
+        field, value = 'win_chance', estimate_win_chance(player_sloot, enemy_sloot, job.get('num_simulations', 160))
+    elif job['type'] == PROFILE_IMAGE:
+        field, value = 'profile_pic_urls', generate_profile_image(player_sloot, enemy_sloot, job['background'])
+    else:
+        raise ValueError(f"unknown job type {job['type']}")
+    return set_enemy_result(job['fid'], job['starting_hash'], job['enemy_number'], field, value)
+
+
+def worker_loop(stop_event):
+    while not stop_event.is_set():
+        popped = redis_client.brpop(QUEUE_KEY, timeout=5)
+        if not popped:
+            continue
+        job = json.loads(popped[1])
+        start_time = time()
+        if start_time - job.get('enqueued_at', start_time) > JOB_MAX_AGE:
+            redis_client.hincrby(STATS_KEY, 'expired', 1)
+            continue
+        try:
+            stored = run_job(job)
+            redis_client.hincrby(STATS_KEY, 'done' if stored else 'stale', 1)
+            logging.info(f"Job {job['id']} {'done' if stored else 'stale'} in {time() - start_time:.2f} seconds")
+        except Exception:
+            # Let the job be enqueued again, the request path computes it inline meanwhile
+            redis_client.delete(dedupe_key(job['id']))
+            redis_client.hincrby(STATS_KEY, 'failed', 1)
+            logging.exception(f"Job {job['id']} failed")
+
+
+def _worker_process(stop_event):
+    try:
+        worker_loop(stop_event)
+    except KeyboardInterrupt:
+        pass  # Ctrl-C reaches the whole process group, run_workers stops us
+
+
+def run_workers(concurrency):
+    """Run concurrency worker processes until interrupted; one per core, the GIL would serialize threads."""
+    stop_event = multiprocessing.Event()
+    processes = [multiprocessing.Process(target=_worker_process, args=(stop_event,), daemon=True)
+                 for _ in range(concurrency)]
+    for process in processes:
+        process.start()
+    logging.info(f"{concurrency} job worker processes started")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        stop_event.set()
+        for process in processes:
+            process.join(timeout=10)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=WORKER_CONCURRENCY, help="worker processes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    run_workers(args.concurrency)
@@ -0,0 +1,245 @@
+"""
+End-to-end load test for the frame flow: /start -> /explore (prev/next) ->
+/explore (battle) -> /battle, driven by synthetic Farcaster signature packets.
+
+Run the app against a local Redis and the stub loot API, then point this at it:
+
+    python loadtest.py --serve-stub-loot 8081 &
+    SLOOT_API_URL=http://127.0.0.1:8081/api/getSyntheticLoot REDIS_URL=redis://localhost:6379/15 \\
+        FS_LOG_DIR=/tmp gunicorn -c gunicorn.conf.py app:app
+    python loadtest.py --target http://127.0.0.1:8000 --users 20 --duration 60
+    python loadtest.py --target http://127.0.0.1:8000 --rate 5 --users 200 --duration 60
+
+Without --rate every user starts a new game as soon as the last one ends (closed
+loop, sized by --users). With --rate, games arrive as a Poisson process at that
+many per second (open loop), with at most --users in flight at once.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep, time
+from urllib.parse import urlparse, parse_qs
+
+from equipment_catalog import level_mapping
+
+ENDPOINTS = ['/start', '/explore', '/explore:battle', '/battle']
+
+
+# ---- Stub loot API -----------------------------------------------------------
+
+ITEM_NAMES = list(level_mapping)
+
+
+def stub_token_uri(address):
+    """A getSyntheticLoot-shaped response, with 8 items picked deterministically from the address."""
+    seed = hashlib.sha256(address.lower().encode('utf-8')).digest()
+    items = [ITEM_NAMES[seed[i] % len(ITEM_NAMES)] for i in range(8)]
+    texts = ''.join(f'<text x="10" y="{20 * (i + 1)}" class="base">{item}</text>' for i, item in enumerate(items))
+    svg = f'<svg xmlns="http://www.w3.org/2000/svg">{texts}</svg>'
+    token = {'name': f'Synthetic Loot {address}',
+             'image': 'data:image/svg+xml;base64,' + base64.b64encode(svg.encode('utf-8')).decode('utf-8')}
+    return {'TokenURI': 'data:application/json;base64,' + base64.b64encode(json.dumps(token).encode('utf-8')).decode('utf-8')}
+
+
+class StubLootHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        address = parse_qs(urlparse(self.path).query).get('address', ['0x' + '00' * 20])[0]
+        if self.latency:
+            sleep(self.latency)
+        body = json.dumps(stub_token_uri(address)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_stub_loot(port, latency=0.0):
+    StubLootHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubLootHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---- Load generator ------------------------------------------------------------
+
+def signature_packet(fid, button_index):
+    """A Farcaster signature packet with a fresh messageHash, like a real client sends."""
+    return {
+        'untrustedData': {
+            'fid': fid,
+            'url': 'http://vanishk.xyz/games/frame-survivor',
+            'messageHash': '0x' + os.urandom(20).hex(),
+            'timestamp': int(time()),
+            'network': 1,
+            'buttonIndex': button_index,
+            'castId': {'fid': fid, 'hash': '0x' + os.urandom(20).hex()},
+        },
+        'trustedData': {'messageBytes': os.urandom(96).hex()},
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.games = 0
+
+    def record(self, endpoint, latency, ok, size):
+        with self.lock:
+            self.samples[endpoint].append((latency, size))
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+class FrameClient:
+    def __init__(self, target, stats, explore_steps, timeout):
+        self.target = target.rstrip('/')
+        self.stats = stats
+        self.explore_steps = explore_steps
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def post(self, endpoint, path, fid, button_index):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        start_time = perf_counter()
+        try:
+            response = self.local.session.post(self.target + path, json=signature_packet(fid, button_index),
+                                               timeout=self.timeout)
+            ok, size = response.status_code == 200, len(response.content)
+        except requests.RequestException:
+            ok, size = False, 0
+        self.stats.record(endpoint, perf_counter() - start_time, ok, size)
+        return ok
+
+    def play(self, fid):
+        """One game: start, browse enemies, enter a battle, fight."""
+        if not self.post('/start', '/start', fid, 1):
+            return
+        for _ in range(random.randint(0, self.explore_steps)):
+            if not self.post('/explore', '/explore', fid, random.choice([1, 3])):
+                return
+        if not self.post('/explore:battle', '/explore', fid, 2):
+            return
+        self.post('/battle', '/battle', fid, 2)
+        with self.stats.lock:
+            self.stats.games += 1
+
+
+def user_fids(user, users, players):
+    """The fids one user plays as. Users never share a fid, so their games can't overwrite each other."""
+    per_user = max(1, players // users)
+    return range(user * per_user + 1, (user + 1) * per_user + 1)
+
+
+def run_closed_loop(client, users, duration, players):
+    deadline = time() + duration
+
+    def user_loop(user):
+        fids = user_fids(user, users, players)
+        while time() < deadline:
+            client.play(random.choice(fids))
+
+    with ThreadPoolExecutor(users) as executor:
+        list(executor.map(user_loop, range(users)))
+
+
+def run_open_loop(client, users, duration, players, rate):
+    deadline = time() + duration
+    # One slot per in-flight game, each with its own fids
+    free_users = queue.SimpleQueue()
+    for user in range(users):
+        free_users.put(user)
+    dropped = 0
+
+    def play(user):
+        try:
+            client.play(random.choice(user_fids(user, users, players)))
+        finally:
+            free_users.put(user)
+
+    with ThreadPoolExecutor(users) as executor:
+        next_arrival = time()
+        while next_arrival < deadline:
+            sleep(max(0.0, next_arrival - time()))
+            try:
+                executor.submit(play, free_users.get_nowait())
+            except queue.Empty:
+                dropped += 1
+            next_arrival += random.expovariate(rate)
+    return dropped
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+def report(stats, elapsed, dropped):
+    print(f"\n{stats.games} games in {elapsed:.1f}s ({stats.games / elapsed:.2f} games/s)"
+          + (f", {dropped} arrivals dropped at the --users limit" if dropped else ""))
+    print(f"{'endpoint':<16} {'reqs':>6} {'req/s':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'avg KB':>8}")
+    for endpoint in ENDPOINTS:
+        samples = stats.samples[endpoint]
+        if not samples:
+            continue
+        latencies = sorted(latency for latency, _ in samples)
+        avg_kb = sum(size for _, size in samples) / len(samples) / 1024
+        error_rate = stats.errors[endpoint] / len(samples) * 100
+        print(f"{endpoint:<16} {len(samples):>6} {len(samples) / elapsed:>7.2f} {error_rate:>5.1f}% "
+              f"{percentile(latencies, 50) * 1000:>6.0f}ms {percentile(latencies, 95) * 1000:>6.0f}ms "
+              f"{percentile(latencies, 99) * 1000:>6.0f}ms {avg_kb:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', help="base URL of the app, e.g. http://127.0.0.1:8000")
+    parser.add_argument('--users', type=int, default=10, help="concurrent games (closed loop) or in-flight cap (open loop)")
+    parser.add_argument('--rate', type=float, default=0, help="new games per second; enables the open loop")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to generate load for")
+    parser.add_argument('--players', type=int, default=1000, help="number of distinct fids to play as, split between the users")
+    parser.add_argument('--explore-steps', type=int, default=4, help="max prev/next presses per game")
+    parser.add_argument('--timeout', type=float, default=30, help="client timeout per request in seconds")
+    parser.add_argument('--serve-stub-loot', type=int, metavar='PORT', help="run the stub loot API on this port")
+    parser.add_argument('--stub-latency', type=float, default=0.0, help="seconds the stub loot API waits per call")
+    args = parser.parse_args()
+
+    if args.serve_stub_loot:
+        serve_stub_loot(args.serve_stub_loot, args.stub_latency)
+        print(f"stub loot API on http://127.0.0.1:{args.serve_stub_loot}/api/getSyntheticLoot")
+        if not args.target:
+            while True:
+                sleep(3600)
+    if not args.target:
+        parser.error("--target is required unless only serving the stub loot API")
+
+    stats = Stats()
+    client = FrameClient(args.target, stats, args.explore_steps, args.timeout)
+    start_time = time()
+    dropped = 0
+    if args.rate:
+        dropped = run_open_loop(client, args.users, args.duration, args.players, args.rate)
+    else:
+        run_closed_loop(client, args.users, args.duration, args.players)
+    report(stats, time() - start_time, dropped)
+
+
+if __name__ == '__main__':
+    main()
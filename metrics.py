@@ -0,0 +1,38 @@
+import threading
+
+# In-process counters and gauges, rendered in the Prometheus text format by
+# /metrics. Each gunicorn worker keeps its own values; values read from Redis
+# (memory, queue depth) are the same whichever worker answers the scrape.
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc_counter(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def render():
+    lines = []
+    with _lock:
+        for kind, values in [('counter', _counters), ('gauge', _gauges)]:
+            seen = set()
+            for (name, labels), value in sorted(values.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} {kind}")
+                    seen.add(name)
+                label_str = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+    return '\n'.join(lines) + '\n'
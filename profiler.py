@@ -0,0 +1,125 @@
+import os
+import sys
+import uuid
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from time import time, sleep
+from game_state import redis_client
+
+# On-demand profiling of one running worker, driven by /admin/profile.
+# A profile runs in a background thread for N seconds while the worker keeps
+# serving requests (sync gunicorn workers handle one request at a time, so the
+# admin request can't block for the duration). The result is stored in Redis,
+# where any worker can return it.
+#
+# cpu:   samples every thread's stack each interval and returns collapsed
+#        stacks ("route;file:function;... count"), ready for flamegraph.pl or
+#        speedscope. Stacks are tagged with the route the thread is serving.
+# alloc: diffs two tracemalloc snapshots and returns the top-N allocation
+#        sites. tracemalloc can't tell routes apart, so the result lists how
+#        many requests each route served in the window instead.
+
+PROFILE_RESULT_TTL = 60 * 60
+MAX_SECONDS = 60
+SAMPLE_INTERVAL = 0.01
+
+# Route each thread is currently serving, set around every request. Routes are
+# url rules, so _route_requests has one entry per rule and never grows beyond that.
+_thread_routes = {}
+_route_requests = Counter()
+_profile_lock = threading.Lock()
+
+
+def set_route(route):
+    _thread_routes[threading.get_ident()] = route
+    _route_requests[route] += 1
+
+
+def clear_route():
+    _thread_routes.pop(threading.get_ident(), None)
+
+
+def _result_key(profile_id):
+    return f"admin:profile:{profile_id}"
+
+
+def _format_frame(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(seconds, route_filter=None):
+    """Collapsed stacks of every thread serving a route, sampled for the given seconds."""
+    sampler_ident = threading.get_ident()
+    stacks = Counter()
+    deadline = time() + seconds
+    while time() < deadline:
+        for ident, frame in sys._current_frames().items():
+            route = _thread_routes.get(ident)
+            if ident == sampler_ident or route is None:
+                continue
+            if route_filter and not route.startswith(route_filter):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_format_frame(frame))
+                frame = frame.f_back
+            stacks[route + ';' + ';'.join(reversed(stack))] += 1
+        sleep(SAMPLE_INTERVAL)
+    return '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common()) + '\n'
+
+
+def sample_allocations(seconds, top):
+    """Top allocation sites that grew over the given seconds, with per-route request counts."""
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(10)
+    requests_before = Counter(_route_requests)
+    try:
+        before = tracemalloc.take_snapshot()
+        sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+
+    served = Counter(_route_requests)
+    served.subtract(requests_before)
+    lines = ["# requests served: " + ', '.join(f"{route}={count}" for route, count in served.items() if count)]
+    for stat in after.compare_to(before, 'traceback')[:top]:
+        lines.append(f"{stat.size_diff / 1024:+.1f} KiB in {stat.count_diff:+d} blocks")
+        lines.extend(f"    {line}" for line in stat.traceback.format(limit=6))
+    return '\n'.join(lines) + '\n'
+
+
+def _run_profile(profile_id, mode, seconds, top, route_filter):
+    try:
+        if mode == 'alloc':
+            result = sample_allocations(seconds, top)
+        else:
+            result = sample_stacks(seconds, route_filter)
+        header = f"# pid {os.getpid()}, {mode} profile over {seconds}s\n"
+        redis_client.set(_result_key(profile_id), header + result, ex=PROFILE_RESULT_TTL)
+    except Exception as e:
+        logging.exception("Profiling failed")
+        redis_client.set(_result_key(profile_id), f"# profiling failed: {e}\n", ex=PROFILE_RESULT_TTL)
+    finally:
+        _profile_lock.release()
+
+
+def start_profile(mode, seconds, top=25, route_filter=None):
+    """Start profiling this worker in the background; returns the profile id, or None if one is running."""
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profile_id = uuid.uuid4().hex
+    seconds = max(1, min(seconds, MAX_SECONDS))
+    threading.Thread(target=_run_profile, args=(profile_id, mode, seconds, top, route_filter), daemon=True).start()
+    return profile_id
+
+
+def get_profile_result(profile_id):
+    """The stored result, or None while the profile is still running (or unknown)."""
+    result = redis_client.get(_result_key(profile_id))
+    return result.decode('utf-8') if result else None
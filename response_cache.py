@@ -0,0 +1,127 @@
+import os
+import json
+import uuid
+import logging
+import threading
+from functools import wraps
+from time import time, sleep
+from flask import request, Response
+from game_state import redis_client
+import metrics
+
+# Farcaster clients retry frame POSTs with the same signature packet, so a
+# messageHash identifies one button press. Responses are cached under it for
+# RESPONSE_TTL; a retry that arrives while the first press is still being
+# computed waits for that result instead of computing its own. Retries come
+# within the client's timeout, so the TTL only needs to cover that, and bodies
+# over MAX_CACHED_BODY (result images run to megabytes) are not cached at all.
+RESPONSE_TTL = int(os.environ.get('FRAME_RESPONSE_TTL', 10))
+MAX_CACHED_BODY = int(os.environ.get('FRAME_RESPONSE_MAX_BYTES', 512 * 1024))
+# Longer than any request should take, so a crashed worker's lock expires
+LOCK_TTL = 30
+# Frame clients give up after ~5s, so a duplicate never waits longer than that
+WAIT_TIMEOUT = 4
+POLL_INTERVAL = 0.05
+
+# KEYS[1]: lock key, ARGV[1]: owner token. Deletes the lock only if it is
+# still ours, not one another worker took after ours expired.
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_release_lock = redis_client.register_script(RELEASE_LOCK_LUA)
+
+# Duplicates within one worker wait on an Event instead of polling Redis
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _cache_key(message_hash):
+    return f"frame_response:{request.path}:{message_hash}"
+
+
+def _get_cached(key):
+    cached = redis_client.get(key)
+    if not cached:
+        return None
+    cached = json.loads(cached)
+    return Response(cached['body'], status=cached['status'], mimetype=cached['mimetype'])
+
+
+def _wait_for_response(key, lock_key):
+    """Poll for another worker's response until it is stored or its lock is gone."""
+    deadline = time() + WAIT_TIMEOUT
+    while time() < deadline:
+        cached = _get_cached(key)
+        if cached:
+            return cached
+        if not redis_client.exists(lock_key):
+            return _get_cached(key)
+        sleep(POLL_INTERVAL)
+    return None
+
+
+def idempotent(view):
+    """Serve repeated signature packets (same messageHash) from the response cache."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        signature_packet = request.get_json(silent=True) or {}
+        message_hash = (signature_packet.get('untrustedData') or {}).get('messageHash')
+        if not message_hash:
+            return view(*args, **kwargs)
+
+        key = _cache_key(message_hash)
+        cached = _get_cached(key)
+        if cached:
+            metrics.inc_counter('fs_response_cache_total', result='hit', route=request.path)
+            logging.info(f"Serving cached response for {message_hash}")
+            return cached
+
+        with _in_flight_lock:
+            event = _in_flight.get(key)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                _in_flight[key] = event
+        if not owner:
+            event.wait(WAIT_TIMEOUT)
+            cached = _get_cached(key)
+            if cached:
+                metrics.inc_counter('fs_response_cache_total', result='waited', route=request.path)
+                return cached
+            # The first press failed or timed out, compute it ourselves
+            return view(*args, **kwargs)
+
+        lock_key = key + ":lock"
+        lock_token = uuid.uuid4().hex
+        locked = False
+        try:
+            locked = redis_client.set(lock_key, lock_token, nx=True, ex=LOCK_TTL)
+            if not locked:
+                # Another worker is computing this press
+                cached = _wait_for_response(key, lock_key)
+                if cached:
+                    metrics.inc_counter('fs_response_cache_total', result='waited', route=request.path)
+                    return cached
+
+            metrics.inc_counter('fs_response_cache_total', result='miss', route=request.path)
+            response = view(*args, **kwargs)
+            if (isinstance(response, Response) and response.status_code == 200
+                    and response.headers.get('Cache-Control') != 'no-store'):
+                body = response.get_data(as_text=True)
+                if len(body) <= MAX_CACHED_BODY:
+                    redis_client.set(key, json.dumps({'body': body, 'status': response.status_code,
+                                                      'mimetype': response.mimetype}), ex=RESPONSE_TTL)
+                else:
+                    metrics.inc_counter('fs_response_cache_total', result='too_large', route=request.path)
+            return response
+        finally:
+            if locked:
+                _release_lock(keys=[lock_key], args=[lock_token])
+            with _in_flight_lock:
+                _in_flight.pop(key, None)
+            event.set()
+    return wrapper
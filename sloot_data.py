@@ -1,48 +1,34 @@
+import os
+import random
 import requests
 import base64
 import json
-from bs4 import BeautifulSoup
-from eth_account import Account
-from web3 import Web3
 from battle import initialize_character
+from equipment_catalog import encode_item, item_level
+from enemy_catalog import EnemyCatalog
+from enemy_derivation import derive_enemy_address, derive_dice_rng
 
-# Equipment Level Mapping
-level_mapping = {
-    # Weapons
-    "Warhammer": 5, "Quarterstaff": 4, "Maul": 3, "Mace": 2, "Club": 1, 
-    "Katana": 5, "Falchion": 4, "Scimitar": 3, "Long Sword": 2, "Short Sword": 1,
-    "Ghost Wand": 5, "Grave Wand": 4, "Bone Wand": 3, "Wand": 2,
-    "Grimoire": 5, "Chronicle": 4, "Tome": 3, "Book": 2,
-    # Chest
-    "Divine Robe": 5, "Silk Robe": 4, "Linen Robe": 3, "Robe": 2, "Shirt": 1,
-    "Demon Husk": 5, "Dragonskin Armor": 4, "Studded Leather Armor": 3, "Hard Leather Armor": 2, "Leather Armor": 1,
-    "Holy Chestplate": 5, "Ornate Chestplate": 4, "Plate Mail": 3, "Chain Mail": 2, "Ring Mail": 1,
-    # Head
-    "Ancient Helm": 5, "Ornate Helm": 4, "Great Helm": 3, "Full Helm": 2, "Helm": 1,
-    "Demon Crown": 5, "Dragon's Crown": 4, "War Cap": 3, "Leather Cap": 2, "Cap": 1,
-    "Crown": 5, "Divine Hood": 4, "Silk Hood": 3, "Linen Hood": 2, "Hood": 1,
-    # Waist
-    "Ornate Belt": 5, "War Belt": 4, "Plated Belt": 3, "Mesh Belt": 2, "Heavy Belt": 1,
-    "Demonhide Belt": 5, "Dragonskin Belt": 4, "Studded Leather Belt": 3, "Hard Leather Belt": 2, "Leather Belt": 1,
-    "Brightsilk Sash": 5, "Silk Sash": 4, "Wool Sash": 3, "Linen Sash": 2, "Sash": 1,
-    # Foot
-    "Holy Greaves": 5, "Ornate Greaves": 4, "Greaves": 3, "Chain Boots": 2, "Heavy Boots": 1,
-    "Demonhide Boots": 5, "Dragonskin Boots": 4, "Studded Leather Boots": 3, "Hard Leather Boots": 2, "Leather Boots": 1,
-    "Divine Slippers": 5, "Silk Slippers": 4, "Wool Shoes": 3, "Linen Shoes": 2, "Shoes": 1,
-    # Hand
-    "Holy Gauntlets": 5, "Ornate Gauntlets": 4, "Gauntlets": 3, "Chain Gloves": 2, "Heavy Gloves": 1,
-    "Demon's Hands": 5, "Dragonskin Gloves": 4, "Studded Leather Gloves": 3, "Hard Leather Gloves": 2, "Leather Gloves": 1,
-    "Divine Gloves": 5, "Silk Gloves": 4, "Wool Gloves": 3, "Linen Gloves": 2, "Gloves": 1,
-    # Neck
-    "Necklace": 3, "Amulet": 3, "Pendant": 3,
-    # Ring
-    "Gold Ring": 3, "Platinum Ring": 3, "Titanium Ring": 3, "Silver Ring": 2, "Bronze Ring": 1,
-}
+SLOOT_API_URL = os.environ.get('SLOOT_API_URL', 'https://tanishq.xyz/api/getSyntheticLoot')
+SLOOT_API_TIMEOUT = 10
+# Shared keep-alive connections to the loot API, sized for the parallel fetches
+# of /get_sloot/batch and the enemy prefetch threads
+http_session = requests.Session()
+http_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32))
+http_session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32))
+# Optional precomputed enemy catalog (see enemy_catalog.py); enemies come from the loot API without it
+ENEMY_CATALOG_PATH = os.environ.get('ENEMY_CATALOG_PATH')
+_enemy_catalog = None
+
+# web3 and bs4 are slow to import, so they are imported where they are used
+# and preloaded by app.warmup() before the workers fork
 
 def generate_random_addresses(n):
-    return [Account.create().address for _ in range(n)]
+    from web3 import Web3
+    # Only 20 random bytes are needed, not a whole key pair
+    return [Web3.to_checksum_address('0x' + os.urandom(20).hex()) for _ in range(n)]
 
 def calculate_greatness(wallet_address, key_prefix):
+    from web3 import Web3
     if wallet_address.startswith('0x'):
         wallet_address = wallet_address[2:]
     address_bytes = bytes.fromhex(wallet_address)
@@ -52,14 +38,9 @@ def calculate_greatness(wallet_address, key_prefix):
     greatness = random_number % 21
     return greatness
 
-def get_level(item_name):
-    for key in level_mapping:
-        if key in item_name:
-            return level_mapping[key]
-    return 1  # Default level if not found
-
-def fetch_sloot_data(address):
-    response = requests.get(f"https://tanishq.xyz/api/getSyntheticLoot?address={address}")
+def fetch_sloot_data(address, rng=None):
+    from bs4 import BeautifulSoup
+    response = http_session.get(f"{SLOOT_API_URL}?address={address}", timeout=SLOOT_API_TIMEOUT)
     data = response.json()
     decoded_data = base64.b64decode(data['TokenURI'].split(',')[1]).decode('utf-8')
     json_data = json.loads(decoded_data)
@@ -72,12 +53,34 @@ def fetch_sloot_data(address):
     rating = 0
     for idx, equipment in enumerate(equipment_list):
         equipment_greatness = calculate_greatness(address, equipment_types[idx % len(equipment_types)])
-        equipment_level = get_level(equipment)
-        full_equipment_list.append([equipment, equipment_level, equipment_greatness])
+        # Items are stored as integer codes, their level is a table lookup
+        equipment_code = encode_item(equipment)
+        equipment_level = item_level(equipment_code)
+        full_equipment_list.append([equipment_code, equipment_level, equipment_greatness])
         rating += equipment_level * equipment_greatness
     
     sloot = {'address': address, 'equipment': full_equipment_list, 'Rating':rating}
     
-    sloot.update({'character':initialize_character(sloot)})
+    sloot.update({'character':initialize_character(sloot, rng)})
     
     return sloot
+
+
+def get_enemy_catalog():
+    """The mmapped enemy catalog, opened once per process, or None if none is configured."""
+    global _enemy_catalog
+    if _enemy_catalog is None and ENEMY_CATALOG_PATH:
+        _enemy_catalog = EnemyCatalog(ENEMY_CATALOG_PATH)
+    return _enemy_catalog
+
+
+def fetch_enemy_sloot(starting_hash, enemy_number):
+    """
+    Enemy #enemy_number of the game started with starting_hash. Sampled from the
+    enemy catalog when one is configured, otherwise derived and fetched from the
+    loot API. Either way the same game always meets the same enemies.
+    """
+    catalog = get_enemy_catalog()
+    if catalog:
+        return catalog.sample(random.Random(f"{starting_hash}:{enemy_number}"))
+    return fetch_sloot_data(derive_enemy_address(starting_hash, enemy_number), derive_dice_rng(starting_hash, enemy_number))
@@ -0,0 +1,98 @@
+"""
+Import-time and first-request-latency report.
+
+    python startup_report.py          # cold worker vs. worker forked after warmup()
+    python startup_report.py --top 15 # also list the slowest imports (python -X importtime)
+
+Every measurement runs in a fresh interpreter so nothing is already cached.
+The "first request" is the local part of /start for one enemy: a profile image
+render and a win chance estimate. The loot API and Redis are not involved.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Fonts and assets are loaded relative to the repo root
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = r"""
+import json, os, sys
+from time import perf_counter
+
+t = perf_counter()
+import app
+import_time = perf_counter() - t
+
+warmup_time = 0.0
+if sys.argv[1] == 'warm':
+    t = perf_counter()
+    app.warmup()
+    warmup_time = perf_counter() - t
+
+from equipment_catalog import level_mapping
+from battle import initialize_character
+items = list(level_mapping.items())
+sloot = {'address': '0x' + '00' * 20, 'Rating': 0,
+         'equipment': [[name, level, 10] for name, level in items[:8]]}
+sloot['character'] = initialize_character(sloot)
+
+def first_request():
+    t = perf_counter()
+    app.generate_profile_image(sloot, sloot, app.profile_bg_path)
+    app.estimate_win_chance(sloot, sloot)
+    return perf_counter() - t
+
+first = first_request()
+second = first_request()
+print(json.dumps({'import': import_time, 'warmup': warmup_time, 'first': first, 'second': second}))
+"""
+
+
+def run_probe(mode, log_dir):
+    env = {**os.environ, 'FS_LOG_DIR': log_dir}
+    output = subprocess.run([sys.executable, '-c', PROBE, mode], capture_output=True, text=True,
+                            env=env, cwd=REPO_DIR, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(top, log_dir):
+    env = {**os.environ, 'FS_LOG_DIR': log_dir}
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            capture_output=True, text=True, env=env, cwd=REPO_DIR).stderr
+    rows = []
+    for line in stderr.splitlines():
+        parts = line.split('|')
+        if not line.startswith('import time:') or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        # Nested imports are indented further; keep the ones app.py triggers directly
+        if parts[2].startswith('  '):
+            continue
+        rows.append((int(parts[1]), parts[2].strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        print(f"{'mode':<6} {'import':>9} {'warmup':>9} {'1st req':>9} {'2nd req':>9}")
+        for mode in ['cold', 'warm']:
+            results = [run_probe(mode, log_dir) for _ in range(args.runs)]
+            best = {key: min(r[key] for r in results) for key in results[0]}
+            print(f"{mode:<6} {best['import'] * 1000:>7.0f}ms {best['warmup'] * 1000:>7.0f}ms "
+                  f"{best['first'] * 1000:>7.0f}ms {best['second'] * 1000:>7.0f}ms")
+
+        if args.top:
+            print("\nslowest imports under `import app` (cumulative):")
+            for cumulative_us, name in slowest_imports(args.top, log_dir):
+                print(f"{cumulative_us / 1000:>9.1f}ms  {name}")
+
+
+if __name__ == '__main__':
+    main()